@@ -0,0 +1,89 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from simulation import GRID_SIZE, TASKS, Simulation
+
+
+def run_one(seed, task, ticks, size=GRID_SIZE):
+    sim = Simulation(seed, size)
+    sim.man.current_task = task
+    sim.run(ticks)
+    return {
+        "seed": seed,
+        "task": task,
+        "ticks": ticks,
+        "size": size,
+        "survival_time": sim.time,
+        "day": sim.day,
+        "alive": not sim.dead,
+        "death_cause": sim.death_cause,
+        "inventory": sim.man.inventory.to_dict(),
+    }
+
+
+def _run_job(job):
+    return run_one(*job)
+
+
+def run_batch(seeds, tasks=(None,), tick_budgets=(10000,), size=GRID_SIZE, workers=None):
+    # Yields one result per (seed, task, ticks) combination as runs finish.
+    # Every run builds its world from its own seed, so the result doesn't
+    # depend on which worker ran it or what that worker ran before.
+    jobs = [(seed, task, ticks, size) for seed, task, ticks in itertools.product(seeds, tasks, tick_budgets)]
+    if workers == 1:
+        for job in jobs:
+            yield _run_job(job)
+        return
+    # Spawned workers start from a clean interpreter that only imports the
+    # simulation, never pygame
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = [executor.submit(_run_job, job) for job in jobs]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def parse_seeds(specs):
+    seeds = []
+    for spec in specs:
+        if ":" in spec:
+            start, stop = spec.split(":")
+            seeds.extend(range(int(start), int(stop)))
+        else:
+            seeds.append(int(spec))
+    return seeds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run many headless survival simulations in parallel")
+    parser.add_argument("--seeds", nargs="+", default=["0:100"], help="seeds or start:stop ranges (default: 0:100)")
+    parser.add_argument("--tasks", nargs="+", choices=TASKS + ["None"], default=["None"], help="tasks to assign the man")
+    parser.add_argument("--ticks", nargs="+", type=int, default=[10000], help="tick budgets per run")
+    parser.add_argument("--size", type=int, default=GRID_SIZE, help="world width and height in tiles")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--out", default=None, help="write JSON lines here instead of stdout")
+    args = parser.parse_args(argv)
+
+    tasks = [None if task == "None" else task for task in args.tasks]
+    out = open(args.out, "w") if args.out else sys.stdout
+    start = time.perf_counter()
+    runs = 0
+    try:
+        for result in run_batch(parse_seeds(args.seeds), tasks, args.ticks, args.size, args.workers):
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            runs += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - start
+    print(f"{runs} runs in {elapsed:.2f} s ({runs / elapsed:.1f} runs/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
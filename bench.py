@@ -0,0 +1,580 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import time
+import sys
+import tracemalloc
+
+import numpy as np
+
+import journal
+import population
+import snapshot
+from population import PopulationSimulation
+from simulation import (BERRY, BERRY_RESPAWN_TIME, CHUNK_SIZE, EMPTY, LOAD_RADIUS, TASKS, TREE, WATER, EntityHash, Environment,
+                        FlowField, Man, Simulation, SpatialIndex, Wolf, find_path, generate_tiles)
+
+RESULTS = {}  # Everything reported this run, by name, for --json and --baseline
+NOISE_FLOOR_MS = 0.05  # Timing differences below this are never regressions
+
+
+def measure(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(name, timings):
+    print(f"{name:<52} median {statistics.median(timings) * 1000:9.3f} ms   "
+          f"min {min(timings) * 1000:9.3f} ms   ({len(timings)} runs)")
+    RESULTS[name] = {"value": statistics.median(timings) * 1000, "unit": "ms", "better": "lower",
+                     "min": min(timings) * 1000, "runs": len(timings)}
+
+
+def record(name, value, unit, better="lower"):
+    # A result that isn't a timing, e.g. bytes or a rate
+    print(f"{name:<52} {value:16.1f} {unit}")
+    RESULTS[name] = {"value": value, "unit": unit, "better": better}
+
+
+def _make_game(seed=0, size=100):
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    from game import Game, GameState
+    game = Game(seed, size)
+    game.state = GameState.IN_GAME
+    return game
+
+
+def bench_frame(frames=30):
+    import pygame
+    game = _make_game()
+    game.draw_game()
+    report("draw_game, nothing changed", measure(game.draw_game, frames))
+
+    def full_frame():
+        game.sim.step()
+        game.scene = None
+        game.draw_game()
+        pygame.display.flip()
+
+    def dirty_frame():
+        game.sim.step()
+        pygame.display.update(game.draw_game())
+
+    report("tick + full repaint + flip", measure(full_frame, frames))
+    report("tick + dirty rects + display.update", measure(dirty_frame, frames))
+    areas = []
+    for _ in range(frames):
+        game.sim.step()
+        areas.append(sum(rect.w * rect.h for rect in game.draw_game()))
+    print(f"{'':<52} median repainted area {statistics.median(areas) / 1e3:.1f}k px of "
+          f"{game.screen.get_width() * game.screen.get_height() / 1e3:.0f}k")
+
+    update_background = game._update_background
+
+    def redraw_background():
+        # How every frame was drawn before the background layer was cached
+        game.invalidate_background()
+        return update_background()
+
+    game._update_background = redraw_background
+    report("draw_game (background redrawn)", measure(game.draw_game, frames))
+
+
+def bench_camera(sizes=(100, 1000, 10000), frames=30):
+    # A moving man scrolls the view every tick; frame time should depend on
+    # the screen, not the world
+    for size in sizes:
+        game = _make_game(size=size)
+        game.man.current_task = "Foraging"
+        game.draw_game()
+
+        def frame():
+            game.sim.step()
+            game.draw_game()
+
+        report(f"tick + draw_game, world {size}x{size}", measure(frame, frames))
+        report(f"  draw_game only, world {size}x{size}", measure(game.draw_game, frames))
+
+
+def bench_text(frames=200):
+    game = _make_game()
+    game.draw_game()
+    game.menu.in_game_menu(game.man.inventory, game.man.current_task)
+    game.text.reset_stats()
+
+    def frame():
+        game.sim.step()
+        game.draw_game()
+        game.menu.in_game_menu(game.man.inventory, game.man.current_task)
+
+    report("frame + in-game menu (text cache)", measure(frame, frames))
+    stats = game.text.stats()
+    print(f"{'':<52} fonts built {stats['font_misses']}, glyph hits {stats['hits']}, "
+          f"glyph misses {stats['misses']}")
+
+
+def bench_nearest(sizes=(100, 1000, 10000), queries=200, brute_queries=20, density=0.002):
+    # find_closest doesn't touch the environment's own state
+    find_closest = Environment.find_closest
+    for size in sizes:
+        rng = random.Random(size)
+        positions = {(rng.randrange(size), rng.randrange(size)) for _ in range(max(1, int(size * size * density)))}
+        index = SpatialIndex(positions)
+        origins = [Man(rng.randrange(size), rng.randrange(size)) for _ in range(queries)]
+
+        for origin in origins[:brute_queries]:
+            assert find_closest(None, origin, positions) == find_closest(None, origin, index)
+
+        brute = measure(lambda: [find_closest(None, o, positions) for o in origins[:brute_queries]], 3)
+        indexed = measure(lambda: [find_closest(None, o, index) for o in origins], 3)
+        report(f"find_closest brute force, grid {size} (per query)", [t / brute_queries for t in brute])
+        report(f"find_closest spatial index, grid {size} (per query)", [t / queries for t in indexed])
+
+
+def bench_world(sizes=(100, 1000, 10000, 100000)):
+    for size in sizes:
+        envs = []
+        report(f"Environment() size {size}", measure(lambda: envs.append(Environment(0, size)), 3))
+        env, allocated = _allocated(lambda: Environment(0, size))
+        record(f"Environment() size {size}, memory", allocated, "bytes")
+        print(f"{'':<52} {len(env.chunks)} chunks resident, {sum(t.nbytes for t in env.chunks.values())} tile bytes")
+
+
+def _legacy_world(size):
+    # The original set-based Environment._create_environment loop
+    trees, berries, water_sources, stones = set(), set(), set(), set()
+    for i in range(size):
+        for j in range(size):
+            if (i, j) != (size // 2, size // 2):
+                if random.random() < 0.01:
+                    trees.add((i, j))
+                elif random.random() < 0.002:
+                    berries.add((i, j))
+                elif random.random() < 0.001:
+                    water_sources.add((i, j))
+                elif random.random() < 0.005:
+                    stones.add((i, j))
+    return trees, berries, water_sources, stones
+
+
+def _allocated(fn):
+    tracemalloc.start()
+    result = fn()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def bench_worldgen(sizes=(100, 500, 1000, 2000)):
+    for size in sizes:
+        report(f"set-based generation, grid {size}", measure(lambda: _legacy_world(size), 1))
+        report(f"vectorized tile grid, grid {size}",
+               measure(lambda: generate_tiles(np.random.default_rng(0), size, size), 3))
+        _, legacy_bytes = _allocated(lambda: _legacy_world(size))
+        _, tile_bytes = _allocated(lambda: generate_tiles(np.random.default_rng(0), size, size))
+        record(f"set-based generation, grid {size}, memory", legacy_bytes, "bytes")
+        record(f"vectorized tile grid, grid {size}, memory", tile_bytes, "bytes")
+
+
+def _object_tick(env, men, wolves, now):
+    # Simulation.step's rules applied one Man/Wolf object at a time
+    for man in men:
+        if man.stamina < 20:
+            man.rest()
+            continue
+        if man.is_hungry(now) and man.inventory["berries"] > 0:
+            man.inventory["berries"] -= 1
+            man.last_ate = now
+            continue
+        items = env.water_sources if man.is_thirsty(now) and not man.is_hungry(now) else env.berries
+        target = env.find_closest(man, items)
+        if target:
+            man.move_to_spot(target)
+    for wolf in list(wolves):
+        man = env.find_closest(wolf, men)
+        if abs(wolf.x - man.x) <= 1 and abs(wolf.y - man.y) <= 1:
+            man.attack(wolf)
+            if wolf.health <= 0:
+                wolves.remove(wolf)
+        else:
+            wolf.move_to_spot((man.x, man.y))
+    for man in men:
+        env.check_step(man, now)
+    env.respawn_berries(now)
+
+
+def bench_population(populations=(10, 100, 1000), ticks=20, size=200):
+    for count in populations:
+        rng = random.Random(count)
+        env = Environment(0, size, load_radius=size // CHUNK_SIZE + 1, wolves=0)
+        men = [Man(rng.randrange(size), rng.randrange(size)) for _ in range(count)]
+        wolves = [Wolf(rng.randrange(size), rng.randrange(size)) for _ in range(count)]
+        clock = iter(range(10 ** 9))
+        report(f"object loop, {count} men + {count} wolves (per tick)",
+               measure(lambda: _object_tick(env, men, wolves, next(clock)), ticks))
+
+        sim = PopulationSimulation(0, size, men=count, wolves=count, task="Foraging")
+        report(f"array store, {count} men + {count} wolves (per tick)", measure(sim.step, ticks))
+
+
+def bench_wolves(counts=(100, 1000, 10000), men=1000, size=500, ticks=5, queries=200):
+    # Chase targeting and hunting as the wolf count grows
+    for count in counts:
+        sim = PopulationSimulation(0, size, men=men, wolves=count, task="Hunting")
+        report(f"population tick, {men} hunters + {count} wolves", measure(sim.step, ticks))
+        sim = PopulationSimulation(0, size, men=men, wolves=count, task="Hunting")
+        nearest = population._nearest
+        population._nearest = population._nearest_brute
+        try:
+            report(f"  full scan instead, {count} wolves", measure(sim.step, ticks))
+        finally:
+            population._nearest = nearest
+
+    rng = random.Random(0)
+    for count in counts:
+        env = Environment(0, size, wolves=count)
+        entities = EntityHash()
+        report(f"EntityHash rebuild, {count} wolves", measure(lambda: entities.rebuild(env.wolves), 5))
+        origins = [Man(rng.randrange(size), rng.randrange(size)) for _ in range(queries)]
+        for origin in origins[:20]:
+            assert entities.nearest(origin.x, origin.y, Wolf) is env.find_closest(origin, env.wolves)
+        scan = measure(lambda: [env.find_closest(o, env.wolves) for o in origins], 3)
+        hashed = measure(lambda: [entities.nearest(o.x, o.y, Wolf) for o in origins], 3)
+        report(f"nearest wolf, list scan, {count} wolves (per query)", [t / queries for t in scan])
+        report(f"nearest wolf, EntityHash, {count} wolves (per query)", [t / queries for t in hashed])
+
+
+class _DictMan:
+    # Man as it was before __slots__ and the fixed-layout inventory
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+        self.last_ate = 0
+        self.last_drank = 0
+        self.health = 200
+        self.stamina = 200
+        self.inventory = {"wood": 0, "stone": 0, "berries": 0}
+        self.weapon = None
+        self.current_task = None
+
+
+class _DictWolf:
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+        self.health = 50
+
+
+def bench_agent_memory(count=100000):
+    for name, cls in (("Man (dict)", _DictMan), ("Man (slots)", Man), ("Wolf (dict)", _DictWolf), ("Wolf (slots)", Wolf)):
+        # Large coordinates so every agent owns its ints, as after a long run
+        agents, size = _allocated(lambda: [cls(1000 + i, 1000 + i) for i in range(count)])
+        record(name, size / count, "bytes per agent")
+    sim = PopulationSimulation(0, 32, men=count, wolves=0)
+    per_man = sum(getattr(sim, name).nbytes for name in vars(sim) if isinstance(getattr(sim, name), np.ndarray)) / count
+    record("Man (PopulationSimulation arrays)", per_man, "bytes per agent")
+
+
+def bench_snapshot(sizes=(100, 1000, 4000), path="bench_snapshot.snap"):
+    for size in sizes:
+        # Whole world resident, so every chunk lands in the snapshot
+        radius = size // CHUNK_SIZE + 1
+        report(f"generate world, size {size}", measure(lambda: Environment(0, size, radius), 1))
+        sim = Simulation(environment=Environment(0, size, radius))
+        sim.man.current_task = "Foraging"
+        sim.run(500)
+        try:
+            for compress in (False, True):
+                kind = "compressed" if compress else "raw"
+                report(f"save ({kind}), size {size}", measure(lambda: snapshot.save(sim, path, compress), 3))
+                print(f"{'':<52} {os.path.getsize(path) / 1e6:.3f} MB, {len(sim.environment.chunks)} chunks")
+                if compress:
+                    report(f"load (compressed), size {size}", measure(lambda: snapshot.load(path), 3))
+                else:
+                    report(f"load (mmap), size {size}", measure(lambda: snapshot.load(path), 3))
+                    report(f"load (read), size {size}", measure(lambda: snapshot.load(path, use_mmap=False), 3))
+            # The same snapshot with the usual radius: only the chunks around
+            # the man are attached on load
+            sim.environment.load_radius = LOAD_RADIUS
+            snapshot.save(sim, path)
+            report(f"load (mmap, radius {LOAD_RADIUS}), size {size}", measure(lambda: snapshot.load(path), 3))
+        finally:
+            os.remove(path)
+
+
+def bench_ticks(ticks=3000, frames=100):
+    for task in [None] + TASKS:
+        sim = Simulation(0)
+        sim.man.current_task = task
+        start = time.perf_counter()
+        sim.run(ticks)
+        record(f"Simulation ticks, task {task}", sim.time / (time.perf_counter() - start), "ticks/s", "higher")
+
+    # Chasing wolves and walking flow fields across chunk borders in large
+    # worlds, where a slow tick is a visible stall
+    for size in (1000, 10000):
+        sim = Simulation(3, size)
+        sim.man.current_task = "Hunting"
+        durations = []
+        for _ in range(ticks):
+            start = time.perf_counter()
+            sim.step()
+            durations.append(time.perf_counter() - start)
+        record(f"Simulation ticks, task Hunting, size {size}", len(durations) / sum(durations), "ticks/s", "higher")
+        record(f"Slowest tick, task Hunting, size {size}", max(durations) * 1000, "ms", "lower")
+
+    from game import RENDER_FPS
+    game = _make_game()
+    game.man.current_task = "Foraging"
+    # update_game is one tick with no frame limiter, advance() paces ticks
+    start = time.perf_counter()
+    for _ in range(frames):
+        game.update_game()
+    record("Game.update_game, unthrottled", frames / (time.perf_counter() - start), "ticks/s", "higher")
+    start = time.perf_counter()
+    for _ in range(frames):
+        game.update_game()
+        game.draw_game()
+    record("Game.update_game + draw_game, unthrottled", frames / (time.perf_counter() - start), "ticks/s", "higher")
+
+    # Max speed: as many ticks as fit in each frame, then a frame drawn
+    game.time_scale = None
+    ticks = game.time
+    start = time.perf_counter()
+    for _ in range(frames):
+        game.advance(1 / RENDER_FPS)
+        game.draw_game()
+    elapsed = time.perf_counter() - start
+    record("Game at max speed, rendering every frame", (game.time - ticks) / elapsed, "ticks/s", "higher")
+    record("Game at max speed, frame rate", frames / elapsed, "frames/s", "higher")
+
+
+def bench_save_load(sizes=(100, 1000), repeat=5, directory="bench_save_load"):
+    cwd = os.getcwd()
+    os.makedirs(directory, exist_ok=True)
+    os.chdir(directory)
+    try:
+        for size in sizes:
+            game = _make_game(size=size)
+            from game import AUTOSAVE_DIR
+            game.man.current_task = "Foraging"
+            game.sim.run(500)
+            report(f"Game.save_game, size {size}", measure(game.save_game, repeat))
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                game.load_game()
+                timings.append(time.perf_counter() - start)
+                # Not part of loading: the autosave it starts, and its files,
+                # which the next load would pick over the save
+                game.stop_autosave()
+                shutil.rmtree(AUTOSAVE_DIR)
+            report(f"Game.load_game, size {size}", timings)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(directory)
+
+
+def _tick_times(sim, ticks, after_tick=None):
+    timings = []
+    for _ in range(ticks):
+        start = time.perf_counter()
+        sim.step()
+        if after_tick is not None:
+            after_tick()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _report_ticks(name, timings, every):
+    report(name, timings)
+    saves = timings[every - 1::every]
+    print(f"{'':<52} max {max(timings) * 1000:9.3f} ms   save ticks max {max(saves) * 1000:9.3f} ms")
+
+
+def bench_pathfinding(size=500, agents=10000, queries=50):
+    env = Environment(0, size, load_radius=size // CHUNK_SIZE + 1, wolves=0)
+    rng = random.Random(0)
+
+    def open_cell():
+        while True:
+            cell = (rng.randrange(size), rng.randrange(size))
+            if env.tile_at(*cell) != TREE:
+                return cell
+
+    starts = [open_cell() for _ in range(queries)]
+    for reach in (10, 50):
+        goals = iter([(start, (min(size - 1, start[0] + reach), min(size - 1, start[1] + reach // 2)))
+                      for start in starts])
+        report(f"A* path, ~{reach} steps", measure(lambda: find_path(env, *next(goals)), queries))
+
+    water = FlowField(env, WATER)
+    report(f"flow field build (water), size {size}", measure(water.reset, 3))
+    field = FlowField(env, BERRY)
+    berries = list(env.berries)
+
+    def eat_and_respawn():
+        pos = rng.choice(berries)
+        env.set_tile(pos, EMPTY)
+        field.update()
+        env.set_tile(pos, BERRY)
+        field.update()
+
+    report("flow field incremental berry removal + respawn", measure(eat_and_respawn, queries))
+    report(f"flow field rebuild (berries), size {size}", measure(field.reset, 3))
+
+    xs = np.array([rng.randrange(size) for _ in range(agents)])
+    ys = np.array([rng.randrange(size) for _ in range(agents)])
+
+    def nearest_steps():
+        for x, y in zip(xs.tolist(), ys.tolist()):
+            target = env.water_sources.nearest(x, y)
+            x += (target[0] > x) - (target[0] < x)
+            y += (target[1] > y) - (target[1] < y)
+
+    report(f"{agents} agents to water, nearest + greedy step", measure(nearest_steps, 3))
+    report(f"{agents} agents to water, shared flow field", measure(lambda: water.steps(xs, ys), 3))
+
+
+def _legacy_respawn(removed_berries, berries, now):
+    # The original per-tick scan over every depleted berry
+    due = [pos for pos, removal_time in removed_berries.items() if now - removal_time > BERRY_RESPAWN_TIME]
+    for pos in due:
+        berries.add(pos)
+        del removed_berries[pos]
+
+
+def bench_respawn(depleted=100000, size=1000):
+    rng = random.Random(0)
+    cells = rng.sample(range(size * size), depleted)
+    # Removal times spread over one respawn period, so every later tick has a few hundred due
+    removals = [((cell // size, cell % size), i * BERRY_RESPAWN_TIME // depleted) for i, cell in enumerate(cells)]
+    idle = range(BERRY_RESPAWN_TIME - 50, BERRY_RESPAWN_TIME)
+    busy = range(BERRY_RESPAWN_TIME + 1, BERRY_RESPAWN_TIME + 51)
+
+    removed_berries, berries = dict(removals), set()
+    for label, ticks in (("nothing due", idle), ("respawning", busy)):
+        clock = iter(ticks)
+        report(f"dict scan, {depleted} depleted, {label} (per tick)",
+               measure(lambda: _legacy_respawn(removed_berries, berries, next(clock)), len(ticks)))
+
+    env = Environment(0, size, load_radius=size // CHUNK_SIZE + 1, wolves=0)
+    for pos, removal_time in removals:
+        env._track_removed_berry(pos, removal_time)
+    for label, ticks in (("nothing due", idle), ("respawning", busy)):
+        clock = iter(ticks)
+        report(f"scheduler, {depleted} depleted, {label} (per tick)",
+               measure(lambda: env.respawn_berries(next(clock)), len(ticks)))
+
+
+def bench_autosave(sizes=(100, 2000), ticks=2500, every=1000, directory="bench_autosave"):
+    for size in sizes:
+        def make_sim():
+            # A wide resident area so every checkpoint has a real world to write
+            sim = Simulation(environment=Environment(0, size, min(size // CHUNK_SIZE + 1, 16)))
+            sim.man.current_task = "Foraging"
+            return sim
+
+        _report_ticks(f"tick, no autosave, size {size}", _tick_times(make_sim(), ticks), every)
+        sim = make_sim()
+        path = os.path.join(directory, "sync.snap")
+        os.makedirs(directory, exist_ok=True)
+        try:
+            # What a blocking save on the game thread costs, once every `every` ticks
+            _report_ticks(f"tick, blocking save every {every}, size {size}", _tick_times(
+                sim, ticks, lambda: sim.time % every or snapshot.save(sim, path)), every)
+            sim = make_sim()
+            autosave = journal.Journal(sim, directory, compact_every=every)
+            _report_ticks(f"tick, journal + compaction every {every}, size {size}", _tick_times(sim, ticks), every)
+            autosave.close()
+            print(f"{'':<52} journal {os.path.getsize(autosave.journal_path) / 1e3:.1f} kB "
+                  f"after {sim.time - autosave.base_time} ticks")
+            report(f"recover, size {size}", measure(lambda: journal.recover(directory), 3))
+        finally:
+            shutil.rmtree(directory)
+
+
+BENCHMARKS = {
+    "frame": bench_frame,
+    "camera": bench_camera,
+    "text": bench_text,
+    "nearest": bench_nearest,
+    "ticks": bench_ticks,
+    "world": bench_world,
+    "worldgen": bench_worldgen,
+    "population": bench_population,
+    "wolves": bench_wolves,
+    "memory": bench_agent_memory,
+    "snapshot": bench_snapshot,
+    "saveload": bench_save_load,
+    "respawn": bench_respawn,
+    "pathfinding": bench_pathfinding,
+    "autosave": bench_autosave,
+}
+
+
+def compare(results, baseline, tolerance):
+    # Prints every result next to its baseline and returns the names that
+    # got worse by more than tolerance
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None or before["unit"] != result["unit"] or not before["value"]:
+            continue
+        change = result["value"] / before["value"] - 1
+        worse = -change if result["better"] == "higher" else change
+        flag = ""
+        # Sub-noise timings flip by large ratios between runs
+        tiny = result["unit"] == "ms" and result["value"] - before["value"] < NOISE_FLOOR_MS
+        if worse > tolerance and not tiny:
+            regressions.append(name)
+            flag = "REGRESSION"
+        print(f"{name:<52} {before['value']:12.3f} -> {result['value']:12.3f} {result['unit']:<16} "
+              f"{change * 100:+7.1f}% {flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Survival Game benchmarks")
+    parser.add_argument("names", nargs="*", help=f"benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument("--json", metavar="PATH", help="write the results here, usable later as a baseline")
+    parser.add_argument("--baseline", metavar="PATH", help="compare with results written by --json and exit "
+                                                           "with status 1 if any got worse")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="how much worse than the baseline counts as a regression (default: %(default)s)")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(unknown)}")
+    for name in args.names or BENCHMARKS:
+        # Same random streams on every run, whatever ran before
+        random.seed(0)
+        BENCHMARKS[name]()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                            "processor": platform.processor(), "cpus": os.cpu_count(), "numpy": np.__version__},
+                "results": RESULTS,
+            }, f, indent=1)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        print()
+        regressions = compare(RESULTS, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,603 @@
+import pygame
+import json
+import os
+import time
+from collections import OrderedDict
+from functools import partial
+
+import numpy as np
+
+import journal
+import snapshot
+from profiler import Profiler, instrument_simulation
+from render import Camera, TextCache
+from simulation import BERRY, CHUNK_SIZE, GRID_SIZE, STONE, TREE, WATER, Inventory, Man, Simulation, Wolf
+
+# Constants
+WIDTH, HEIGHT = 1000, 1000
+TILE_SIZE = WIDTH // GRID_SIZE  # Default zoom, the whole default world on screen
+TICK_RATE = 2  # Simulation ticks per second at 1x
+RENDER_FPS = 60  # Frames and input polls per second in game
+MENU_FPS = 30  # Input polling rate while a menu is shown
+MAX_CATCH_UP = 20  # Ticks run in one frame before a backlog is dropped
+MAX_SPEED_BUDGET = 0.75  # Share of each frame spent ticking at max speed
+PAUSE_KEY = pygame.K_p
+SPEED_KEYS = {pygame.K_1: 1, pygame.K_2: 10, pygame.K_3: None}  # Time scales, None for as fast as possible
+SAVE_FILE = "savegame.snap"
+LEGACY_SAVE_FILE = "savegame.json"
+AUTOSAVE_DIR = "autosave"
+PROFILER_KEY = pygame.K_F3
+GROUND_SHADE_STREAM = 1  # Extra seed key for the ground shading of each chunk
+# Game methods timed while the profiler is on, next to the simulation's
+PROFILED_PHASES = ("handle_events", "advance", "update_game", "draw_game", "_scene", "_update_background", "_draw_ground",
+                   "_draw_trees", "_draw_bar", "draw_menu", "_show")
+
+# Colors
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+GRAY = (240, 240, 240)
+RED = (255, 0, 0)
+BLUE = (0, 0, 255)
+GREEN = (0, 255, 0)
+DARK_GREEN = (34, 139, 34)
+BROWN = (139, 69, 19)
+LIGHT_BLUE = (0, 200, 255)
+YELLOW = (255, 255, 0)
+
+class Menu:
+    def __init__(self, screen, text_cache):
+        self.screen = screen
+        self.text = text_cache
+        self.font_size = 36
+
+    def draw_button(self, text, rect, color, text_color):
+        pygame.draw.rect(self.screen, color, rect)
+        text_surf = self.text.render(text, self.font_size, text_color)
+        text_rect = text_surf.get_rect(center=rect.center)
+        self.screen.blit(text_surf, text_rect)
+
+    def main_menu(self):
+        self.screen.fill(WHITE)
+        play_button = pygame.Rect(WIDTH // 2 - 100, HEIGHT // 2 - 60, 200, 50)
+        upgrades_button = pygame.Rect(WIDTH // 2 - 100, HEIGHT // 2 + 10, 200, 50)
+        load_button = pygame.Rect(WIDTH // 2 - 100, HEIGHT // 2 + 80, 200, 50)
+        self.draw_button("Play", play_button, GREEN, BLACK)
+        self.draw_button("Upgrades", upgrades_button, LIGHT_BLUE, BLACK)
+        self.draw_button("Load Game", load_button, YELLOW, BLACK)
+        return play_button, upgrades_button, load_button
+
+    def upgrade_menu(self, wood, stone):
+        self.screen.fill(WHITE)
+        craft_axe_button = pygame.Rect(WIDTH // 2 - 100, HEIGHT // 2 - 60, 200, 50)
+        craft_sword_button = pygame.Rect(WIDTH // 2 - 100, HEIGHT // 2 + 10, 200, 50)
+        back_button = pygame.Rect(WIDTH // 2 - 100, HEIGHT - 100, 200, 50)
+        self.draw_button("Craft Axe (5 wood, 3 stone)", craft_axe_button, GREEN, BLACK)
+        self.draw_button("Craft Sword (3 wood, 5 stone)", craft_sword_button, BLUE, BLACK)
+        self.draw_button("Back", back_button, RED, BLACK)
+        
+        resources_text = f"Wood: {wood}, Stone: {stone}"
+        text_surf = self.text.render(resources_text, self.font_size, BLACK)
+        self.screen.blit(text_surf, (WIDTH // 2 - 100, HEIGHT // 2 - 120))
+        
+        return craft_axe_button, craft_sword_button, back_button
+
+    def in_game_menu(self, inventory, current_task):
+        menu_width, menu_height = WIDTH - 200, HEIGHT // 2
+        menu_x, menu_y = (WIDTH - menu_width) - 100, (HEIGHT - menu_height) // 2
+        menu_surface = pygame.Surface((menu_width, menu_height))
+        menu_surface.fill(WHITE)
+        pygame.draw.rect(menu_surface, BLACK, menu_surface.get_rect(), 2)
+        
+        inventory_text = [f"{item}: {count}" for item, count in inventory.items()]
+        for i, text in enumerate(inventory_text):
+            text_surf = self.text.render(text, self.font_size, BLACK)
+            menu_surface.blit(text_surf, (20, 20 + i * 40))
+        
+        save_button = pygame.Rect(20, menu_height - 70, 160, 50)
+        self.draw_button("Save Game", save_button, GREEN, BLACK)
+        
+        # Add task buttons
+        tasks = ["None", "Mining", "Woodcutting", "Foraging", "Hunting"]
+        button_width, button_height = 120, 40
+        buttons = []
+        for i, task in enumerate(tasks):
+            button = pygame.Rect(200 + (i % 3) * (button_width + 10), 20 + (i // 3) * (button_height + 10), button_width, button_height)
+            color = LIGHT_BLUE if task == current_task else GRAY
+            self.draw_button(task, button, color, BLACK)
+            buttons.append((task, button))
+        
+        self.screen.blit(menu_surface, (menu_x, menu_y))
+        return pygame.Rect(menu_x + 20, menu_y + menu_height - 70, 160, 50), buttons
+
+    def death_screen(self):
+        self.screen.fill(WHITE)
+        text = self.text.render("You're Dead", 72, BLACK)
+        text_rect = text.get_rect(center=(WIDTH // 2, HEIGHT // 2 - 50))
+        self.screen.blit(text, text_rect)
+        main_menu_button = pygame.Rect(WIDTH // 2 - 100, HEIGHT // 2 + 25, 200, 50)
+        self.draw_button("Main Menu", main_menu_button, GREEN, BLACK)
+        return main_menu_button
+
+class GameState:
+    MAIN_MENU = 'main_menu'
+    IN_GAME = 'in_game'
+    IN_GAME_MENU = 'in_game_menu'
+    UPGRADE_MENU = 'upgrade_menu'
+    DEATH_SCREEN = 'death_screen'
+
+class Game:
+    def __init__(self, seed=None, size=GRID_SIZE):
+        pygame.init()
+        self.screen = pygame.display.set_mode((WIDTH, HEIGHT))
+        pygame.display.set_caption("Survival Game")
+        self.clock = pygame.time.Clock()
+        self.text = TextCache()
+        self.menu = Menu(self.screen, self.text)
+        self.camera = Camera(WIDTH, HEIGHT, TILE_SIZE)
+        self.background = None
+        self.background_key = None  # Environment and view the background shows
+        self.ground = OrderedDict()  # Ground of single chunks at the current zoom
+        self.ground_env = None
+        self.scene = None  # What draw_game last put on screen, None to repaint it all
+        self.shown_state = None  # State the screen currently shows
+        self.redraw = False  # Set by input so a menu is repainted
+        self.seed = seed
+        self.size = size
+        self.autosave = None
+        self.profiler = None
+        self.profiled_sim = None
+        self.time_scale = 1
+        self.paused = False
+        self.accumulator = 0.0  # Real time at the current speed not yet simulated, in seconds
+        self.previous = (None, {})  # Simulation and entity positions before its last tick
+        self.reset_game()
+        self.state = GameState.MAIN_MENU
+        self.running = True
+
+    def reset_game(self):
+        self.sim = Simulation(self.seed, self.size)
+
+    def start_autosave(self):
+        # Journals every tick of the current run on a background thread
+        self.stop_autosave()
+        self.autosave = journal.Journal(self.sim, AUTOSAVE_DIR)
+
+    def stop_autosave(self):
+        if self.autosave is not None:
+            self.autosave.close()
+            self.autosave = None
+
+    @property
+    def man(self):
+        return self.sim.man
+
+    @property
+    def environment(self):
+        return self.sim.environment
+
+    @property
+    def weather(self):
+        return self.sim.weather
+
+    @property
+    def time(self):
+        return self.sim.time
+
+    @property
+    def day(self):
+        return self.sim.day
+
+    def draw_game(self):
+        # Repaints only what changed since the last frame and returns the
+        # screen rectangles that need to reach the display. The view moves a
+        # whole tile at a time, once the drawn man is closer to the next one.
+        x, y = self._interpolate(self.man)
+        self.camera.follow(round(x), round(y), self.environment.size)
+        scene = self._scene()
+        if self._update_background() or self.scene is None:
+            self.screen.blit(self.background, (0, 0))
+            for _, _, draw in scene.values():
+                draw()
+            dirty = [self.screen.get_rect()]
+        else:
+            dirty = []
+            for key, (rect, signature, _) in self.scene.items():
+                entry = scene.get(key)
+                if entry is None:
+                    dirty.append(rect)
+                elif entry[0] != rect or entry[1] != signature:
+                    dirty.append(rect)
+                    dirty.append(entry[0])
+            dirty.extend(rect for key, (rect, _, _) in scene.items() if key not in self.scene)
+            rects = [rect for rect, _, _ in scene.values()]
+            draws = [draw for _, _, draw in scene.values()]
+            for rect in dirty:
+                # Background under the rectangle, then everything on top of it in order
+                self.screen.set_clip(rect)
+                self.screen.blit(self.background, rect, rect)
+                for i in rect.collidelistall(rects):
+                    draws[i]()
+            self.screen.set_clip(None)
+        self.scene = scene
+        return dirty
+
+    def _scene(self):
+        # Everything drawn over the background in painting order, as
+        # {key: (rect, signature, draw)}. An entry whose rect or signature
+        # changes between frames is repainted.
+        scene = {}
+        visible = self.environment.resources_in(*self.camera.visible())
+        self._add_items(scene, visible.get(BERRY, ()), "B", RED)
+        self._add_items(scene, visible.get(WATER, ()), "W", LIGHT_BLUE)
+        self._add_items(scene, visible.get(STONE, ()), "S", GRAY)
+        self._add_man(scene)
+        self._add_wolves(scene)
+        self._add_ui(scene)
+        if self.profiler is not None:
+            self._add_profile(scene)
+        return scene
+
+    def _add_ui(self, scene):
+        bars = [
+            (RED, self.man.get_hunger_level(self.time)),
+            (BLUE, self.man.get_thirst_level(self.time)),
+            (GREEN, self.man.health / 100),
+            (YELLOW, self.man.stamina / 100)
+        ]
+        for i, (color, level) in enumerate(bars):
+            bar_width, bar_height = 150, 20
+            bar_x, bar_y = 10, 10 + i * (bar_height + 5)
+            filled = int(bar_width * level)
+            rect = pygame.Rect(bar_x, bar_y, max(bar_width, filled), bar_height)
+            scene[("bar", i)] = (rect, filled, partial(self._draw_bar, rect.topleft, bar_width, filled, color))
+
+        if self.paused:
+            speed = "Paused"
+        else:
+            speed = "Speed: max" if self.time_scale is None else f"Speed: {self.time_scale}x"
+        for key, text, pos in (("day", f"Day: {self.day}", (WIDTH - 100, 10)),
+                               ("weather", f"Weather: {self.weather.current_condition}", (WIDTH - 150, 40)),
+                               ("speed", speed, (WIDTH - 150, 70))):
+            surf = self.text.render(text, 24, BLACK)
+            rect = surf.get_rect(topleft=pos)
+            scene[key] = (rect, text, partial(self.screen.blit, surf, rect))
+
+    def _draw_bar(self, pos, width, filled, color):
+        pygame.draw.rect(self.screen, GRAY, (*pos, width, 20))
+        pygame.draw.rect(self.screen, color, (*pos, filled, 20))
+
+    def _add_profile(self, scene):
+        rows = [("phase", "calls", "p50 ms", "p95 ms", "p99 ms")]
+        rows += [(row["phase"], str(row["calls"]), f"{row['p50_ms']:.2f}", f"{row['p95_ms']:.2f}",
+                  f"{row['p99_ms']:.2f}") for row in self.profiler.summary()]
+        rows = tuple(rows)
+        line_height = 18
+        rect = pygame.Rect(10, 0, 520, line_height * len(rows) + 10)
+        rect.bottom = HEIGHT - 10
+        scene["profile"] = (rect, rows, partial(self._draw_profile, rect, rows, line_height))
+
+    def _draw_profile(self, rect, rows, line_height):
+        pygame.draw.rect(self.screen, WHITE, rect)
+        pygame.draw.rect(self.screen, BLACK, rect, 1)
+        for i, row in enumerate(rows):
+            for column, text in zip((5, 235, 305, 375, 445), row):
+                self.screen.blit(self.text.render(text, 20, BLACK), (rect.x + column, rect.y + 5 + i * line_height))
+
+    def toggle_profiler(self):
+        # Times the phases of every frame and shows them over the game; off,
+        # every timed method is put back as it was
+        if self.profiler is None:
+            self.profiler = Profiler()
+            self.profiler.instrument(self, *PROFILED_PHASES, prefix="game.")
+            self.profiled_sim = None
+        else:
+            self.profiler.remove()
+            self.profiler = None
+        self.scene = None
+
+    def invalidate_background(self):
+        self.background_key = None
+        self.ground.clear()
+        self.scene = None
+
+    def _update_background(self):
+        # Ground and trees never change after the environment is created, so
+        # the part in view is drawn into a cached layer that is only rebuilt
+        # when the camera moves or zooms. True when it was rebuilt.
+        camera = self.camera
+        key = (self.environment, camera.x0, camera.y0, camera.tile_size)
+        if self.background is not None and key == self.background_key:
+            return False
+        if self.background is None:
+            self.background = pygame.Surface((WIDTH, HEIGHT)).convert()
+        if self.ground_env is not self.environment:
+            self.ground.clear()
+            self.ground_env = self.environment
+        self.background.fill(WHITE)
+        self._draw_ground(self.background)
+        self._draw_trees(self.background)
+        self.background_key = key
+        return True
+
+    def _draw_ground(self, surface):
+        x0, y0, x1, y1 = self.camera.visible()
+        x0, y0 = max(0, x0), max(0, y0)
+        x1, y1 = min(self.environment.size, x1), min(self.environment.size, y1)
+        for cx in range(x0 // CHUNK_SIZE, (x1 - 1) // CHUNK_SIZE + 1):
+            for cy in range(y0 // CHUNK_SIZE, (y1 - 1) // CHUNK_SIZE + 1):
+                surface.blit(self._ground_chunk(cx, cy), self.camera.to_screen(cx * CHUNK_SIZE, cy * CHUNK_SIZE))
+
+    def _ground_chunk(self, cx, cy):
+        # Ground of one chunk scaled up from one pixel per tile, cached for
+        # about two screens' worth of chunks
+        tile_size = self.camera.tile_size
+        key = (cx, cy, tile_size)
+        surface = self.ground.get(key)
+        if surface is not None:
+            self.ground.move_to_end(key)
+            return surface
+        # Own stream per chunk, apart from the simulation's, so drawing never
+        # changes a run and a chunk looks the same every time it is drawn.
+        # The extra key keeps it apart from the terrain stream of the chunk,
+        # which is seeded with the same seed and coordinates.
+        rng = np.random.default_rng([self.environment.seed % 2 ** 64, cx, cy, GROUND_SHADE_STREAM])
+        pixels = np.zeros((CHUNK_SIZE, CHUNK_SIZE, 3), dtype=np.uint8)
+        pixels[:, :, 1] = rng.integers(250, 256, (CHUNK_SIZE, CHUNK_SIZE))
+        # Past the world's edge stays white
+        pixels[max(0, self.environment.size - cx * CHUNK_SIZE):, :] = WHITE
+        pixels[:, max(0, self.environment.size - cy * CHUNK_SIZE):] = WHITE
+        size = CHUNK_SIZE * tile_size
+        surface = self.ground[key] = pygame.transform.scale(pygame.surfarray.make_surface(pixels), (size, size))
+        limit = 2 * (self.camera.columns // CHUNK_SIZE + 2) * (self.camera.rows // CHUNK_SIZE + 2)
+        while len(self.ground) > limit:
+            self.ground.popitem(last=False)
+        return surface
+
+    def _draw_trees(self, surface):
+        tile_size = self.camera.tile_size
+        x0, y0, x1, y1 = self.camera.visible()
+        # Canopies reach half a tile up, so trees just below the view show too
+        for tree in self.environment.resources_in(x0, y0, x1, y1 + 1).get(TREE, ()):
+            x, y = self.camera.to_screen(*tree)
+            pygame.draw.rect(surface, BROWN, (x + tile_size // 3, y, tile_size // 3, tile_size))
+            pygame.draw.circle(surface, DARK_GREEN, (x + tile_size // 2, y), tile_size // 2)
+
+    def _glyph(self, text, color):
+        # Letters scale with the zoom, 15 points at the default tile size
+        return self.text.render(text, max(8, 15 * self.camera.tile_size // TILE_SIZE), color)
+
+    def _tile_center(self, x, y):
+        sx, sy = self.camera.to_screen(x, y)
+        return round(sx + self.camera.tile_size / 2), round(sy + self.camera.tile_size / 2)
+
+    def _add_items(self, scene, items, text, color):
+        text_surf = self._glyph(text, color)
+        blit = self.screen.blit
+        for item in items:
+            text_rect = text_surf.get_rect(center=self._tile_center(*item))
+            scene[(text, item)] = (text_rect, text, partial(blit, text_surf, text_rect))
+
+    def _add_man(self, scene):
+        text = self._glyph("M", BLACK)
+        text_rect = text.get_rect(center=self._tile_center(*self._interpolate(self.man)))
+        scene["man"] = (text_rect, "M", partial(self.screen.blit, text, text_rect))
+
+    def _add_wolves(self, scene):
+        text = self._glyph("W", RED)
+        x0, y0, x1, y1 = self.camera.visible()
+        entities = self.sim.entities
+        if not entities:
+            # Not built yet: a new or just loaded game that hasn't ticked
+            entities.rebuild([self.man] + self.environment.wolves)
+        # The hash has positions from the start of the last tick and wolves
+        # move one tile a tick, so look one tile further out
+        for wolf in entities.in_rect(x0 - 1, y0 - 1, x1 + 1, y1 + 1, Wolf):
+            if x0 <= wolf.x < x1 and y0 <= wolf.y < y1:
+                text_rect = text.get_rect(center=self._tile_center(*self._interpolate(wolf)))
+                scene[("wolf", entities.order[wolf])] = (text_rect, "W", partial(self.screen.blit, text, text_rect))
+
+    def _interpolate(self, entity):
+        # Where an entity is drawn between its position before the last tick
+        # and its current one, by how far the next tick is along
+        sim, positions = self.previous
+        before = positions.get(entity) if sim is self.sim else None
+        if before is None:
+            return entity.x, entity.y
+        alpha = min(1.0, self.accumulator * TICK_RATE)
+        return before[0] + (entity.x - before[0]) * alpha, before[1] + (entity.y - before[1]) * alpha
+
+    def handle_events(self):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                self.running = False
+            elif event.type == pygame.WINDOWEXPOSED:
+                # Repaint everything once the window is visible again
+                self.shown_state = None
+            elif event.type == pygame.KEYDOWN:
+                self.redraw = True
+                if event.key == pygame.K_SPACE and self.state in [GameState.IN_GAME, GameState.IN_GAME_MENU]:
+                    self.state = GameState.IN_GAME_MENU if self.state == GameState.IN_GAME else GameState.IN_GAME
+                elif event.key == PAUSE_KEY and self.state == GameState.IN_GAME:
+                    self.paused = not self.paused
+                elif event.key in SPEED_KEYS and self.state == GameState.IN_GAME:
+                    self.time_scale = SPEED_KEYS[event.key]
+                    self.paused = False
+                elif event.key == PROFILER_KEY:
+                    self.toggle_profiler()
+                elif event.key in (pygame.K_EQUALS, pygame.K_PLUS, pygame.K_KP_PLUS):
+                    self.zoom(1)
+                elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                    self.zoom(-1)
+            elif event.type == pygame.MOUSEWHEEL:
+                self.zoom(1 if event.y > 0 else -1)
+            elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                self.redraw = True
+                self.handle_mouse_click(event.pos)
+
+    def zoom(self, step):
+        if self.state == GameState.IN_GAME and self.camera.zoom(step):
+            self.ground.clear()
+
+    def handle_mouse_click(self, mouse_pos):
+        if self.state == GameState.MAIN_MENU:
+            play_button, upgrades_button, load_button = self.menu.main_menu()
+            if play_button.collidepoint(mouse_pos):
+                self.reset_game()
+                self.start_autosave()
+                self.state = GameState.IN_GAME
+            elif upgrades_button.collidepoint(mouse_pos):
+                self.state = GameState.UPGRADE_MENU
+            elif load_button.collidepoint(mouse_pos):
+                self.load_game()
+        elif self.state == GameState.UPGRADE_MENU:
+            craft_axe_button, craft_sword_button, back_button = self.menu.upgrade_menu(self.man.inventory["wood"], self.man.inventory["stone"])
+            if back_button.collidepoint(mouse_pos):
+                self.state = GameState.MAIN_MENU
+            elif craft_axe_button.collidepoint(mouse_pos):
+                self.craft_item("axe")
+            elif craft_sword_button.collidepoint(mouse_pos):
+                self.craft_item("sword")
+        elif self.state == GameState.IN_GAME_MENU:
+            save_button, task_buttons = self.menu.in_game_menu(self.man.inventory, self.man.current_task)
+            if save_button.collidepoint(mouse_pos):
+                self.save_game()
+            for task, button in task_buttons:
+                if button.collidepoint(mouse_pos):
+                    self.man.current_task = task if task != "None" else None
+        elif self.state == GameState.DEATH_SCREEN:
+            main_menu_button = self.menu.death_screen()
+            if main_menu_button.collidepoint(mouse_pos):
+                self.state = GameState.MAIN_MENU
+
+    def craft_item(self, item):
+        if item == "axe" and self.man.inventory["wood"] >= 5 and self.man.inventory["stone"] >= 3:
+            self.man.inventory["wood"] -= 5
+            self.man.inventory["stone"] -= 3
+            self.man.weapon = "axe"
+        elif item == "sword" and self.man.inventory["wood"] >= 3 and self.man.inventory["stone"] >= 5:
+            self.man.inventory["wood"] -= 3
+            self.man.inventory["stone"] -= 5
+            self.man.weapon = "sword"
+
+    def update_game(self):
+        # One simulation tick
+        self.previous = (self.sim, {entity: (entity.x, entity.y) for entity in [self.man] + self.environment.wolves})
+        self.sim.step()
+        if self.sim.dead:
+            # A dead run isn't worth resuming; Load Game falls back to the save
+            self.stop_autosave()
+            journal.discard(AUTOSAVE_DIR)
+            self.state = GameState.DEATH_SCREEN
+
+    def advance(self, elapsed):
+        # Runs the ticks due after elapsed seconds of real time at the
+        # current speed, on a fixed timestep whatever the frame rate
+        if self.paused:
+            return
+        if self.time_scale is None:
+            deadline = time.perf_counter() + MAX_SPEED_BUDGET / RENDER_FPS
+            while self.state == GameState.IN_GAME and time.perf_counter() < deadline:
+                self.update_game()
+            self.accumulator = 1 / TICK_RATE  # Drawn at the latest tick
+            return
+        self.accumulator += elapsed * self.time_scale
+        ticks = 0
+        while self.accumulator * TICK_RATE >= 1 and self.state == GameState.IN_GAME:
+            if ticks == MAX_CATCH_UP:
+                # Too far behind, e.g. after the window was dragged: drop the
+                # backlog rather than stall frame after frame catching up
+                self.accumulator = 0.0
+                break
+            self.update_game()
+            self.accumulator -= 1 / TICK_RATE
+            ticks += 1
+
+    def save_game(self):
+        snapshot.save(self.sim, SAVE_FILE)
+
+    def load_game(self):
+        # Whichever of the manual save and the autosave is newer, unless the
+        # autosave's run has ended, e.g. one left behind by a crash on death.
+        # Timestamps are coarse, so a tie goes to the autosave: no ticks run
+        # while the menu the save is made from is open, so the autosave
+        # holds the saved state or a later one.
+        recovered = None
+        autosave_time = journal.autosave_time(AUTOSAVE_DIR)
+        if autosave_time is not None and (not os.path.exists(SAVE_FILE) or autosave_time >= os.path.getmtime(SAVE_FILE)):
+            self.stop_autosave()
+            recovered = journal.recover(AUTOSAVE_DIR)
+            if recovered.dead:
+                journal.discard(AUTOSAVE_DIR)
+                recovered = None
+        if recovered is not None:
+            self.sim = recovered
+            self.start_autosave()
+            self.state = GameState.IN_GAME
+        elif os.path.exists(SAVE_FILE):
+            self.sim = snapshot.load(SAVE_FILE)
+            self.start_autosave()
+            self.state = GameState.IN_GAME
+        elif os.path.exists(LEGACY_SAVE_FILE):
+            # Saves from before full-world snapshots only have the man, time
+            # and weather; the world is regenerated
+            with open(LEGACY_SAVE_FILE, "r") as f:
+                game_state = json.load(f)
+            
+            self.sim = Simulation(self.seed, self.size)
+            self.sim.man = Man(game_state["man"]["x"], game_state["man"]["y"])
+            self.man.last_ate = game_state["man"]["last_ate"]
+            self.man.last_drank = game_state["man"]["last_drank"]
+            self.man.health = game_state["man"]["health"]
+            self.man.stamina = game_state["man"]["stamina"]
+            self.man.inventory = Inventory.from_dict(game_state["man"]["inventory"])
+            self.man.weapon = game_state["man"]["weapon"]
+            self.man.current_task = game_state["man"]["current_task"]
+            
+            self.sim.time = game_state["time"]
+            self.sim.day = game_state["day"]
+            self.weather.current_condition = game_state["weather"]
+            
+            self.start_autosave()
+            self.state = GameState.IN_GAME
+
+    def draw_menu(self):
+        if self.state == GameState.MAIN_MENU:
+            self.menu.main_menu()
+        elif self.state == GameState.UPGRADE_MENU:
+            self.menu.upgrade_menu(self.man.inventory["wood"], self.man.inventory["stone"])
+        elif self.state == GameState.IN_GAME_MENU:
+            self.menu.in_game_menu(self.man.inventory, self.man.current_task)
+        elif self.state == GameState.DEATH_SCREEN:
+            self.menu.death_screen()
+
+    def _show(self, rects=None):
+        if rects is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(rects)
+
+    def run(self):
+        while self.running:
+            if self.profiler is not None and self.profiled_sim is not self.sim:
+                # A new game or a loaded one replaced the simulation
+                instrument_simulation(self.profiler, self.sim)
+                self.profiled_sim = self.sim
+            self.handle_events()
+            if self.state == GameState.IN_GAME:
+                if self.shown_state != GameState.IN_GAME:
+                    # Coming back from a menu that painted over the game
+                    self.scene = None
+                self.advance(self.clock.tick(RENDER_FPS) / 1000)
+                self._show(self.draw_game())
+                self.shown_state = GameState.IN_GAME
+            else:
+                # Menus don't change on their own: paint them when they are
+                # entered or after input, then just wait for events
+                if self.state != self.shown_state or self.redraw:
+                    self.draw_menu()
+                    self._show()
+                    self.shown_state = self.state
+                self.clock.tick(MENU_FPS)
+            self.redraw = False
+        self.stop_autosave()
+        pygame.quit()
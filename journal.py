@@ -0,0 +1,248 @@
+import os
+import queue
+import struct
+import sys
+import threading
+
+import snapshot
+from simulation import Weather, make_rng
+
+# Autosave: a full snapshot plus an append-only journal of what changed
+# since it was taken. The simulation only encodes records into memory; a
+# background thread does all the file I/O.
+#
+# Journal file: header (magic, version, time of the snapshot it extends),
+# then tagged records. Every tick ends with a TICK record, and recovery
+# only applies ticks whose TICK record made it to disk.
+MAGIC = b"NPHJRNL\0"
+VERSION = 1
+COMPACT_EVERY = 2000  # Ticks between full snapshots
+SNAPSHOT_FILE = "autosave.snap"
+JOURNAL_FILE = "autosave.journal"
+
+HEADER = struct.Struct("<8sH6xq")
+TAG = struct.Struct("<B")
+TILE = struct.Struct("<iiB")
+BERRY_TIMER = struct.Struct("<iiq")
+WEATHER = struct.Struct("<Bq")
+TICK = struct.Struct("<qqBB")
+
+TILE_TAG, BERRY_TIMER_TAG, MAN_TAG, WOLVES_TAG, WEATHER_TAG, TICK_TAG = range(6)
+
+
+class Journal:
+    def __init__(self, sim, directory=".", compact_every=COMPACT_EVERY):
+        self.sim = sim
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+        self.journal_path = os.path.join(directory, JOURNAL_FILE)
+        self.compact_every = compact_every
+        os.makedirs(directory, exist_ok=True)
+        self.buffer = bytearray()
+        self.base_time = None
+        self.last_man = self.last_wolves = self.last_weather = None
+        self.error = None  # Set by the writer thread if a write fails
+        self.failed = False
+        self.queue = queue.SimpleQueue()
+        self.writer = threading.Thread(target=self._write_loop, daemon=True)
+        self.writer.start()
+        sim.journal = sim.environment.journal = self
+        self.checkpoint()
+
+    def tile_changed(self, pos, kind):
+        self.buffer += TAG.pack(TILE_TAG) + TILE.pack(pos[0], pos[1], kind)
+
+    def berry_timer_changed(self, pos, removal_time):
+        self.buffer += TAG.pack(BERRY_TIMER_TAG) + BERRY_TIMER.pack(pos[0], pos[1], removal_time)
+
+    def end_tick(self):
+        if self._check_error():
+            return
+        sim = self.sim
+        # Entities are few and small: compare their packed records with the
+        # last ones written instead of tracking every assignment
+        man = snapshot.pack_man(sim.man)
+        if man != self.last_man:
+            self.buffer += TAG.pack(MAN_TAG) + man
+            self.last_man = man
+        wolves = snapshot.pack_wolves(sim.environment.wolves)
+        if wolves != self.last_wolves:
+            self.buffer += TAG.pack(WOLVES_TAG) + wolves
+            self.last_wolves = wolves
+        weather = WEATHER.pack(Weather.conditions.index(sim.weather.current_condition), sim.weather.change_time)
+        if weather != self.last_weather:
+            self.buffer += TAG.pack(WEATHER_TAG) + weather
+            self.last_weather = weather
+        self.buffer += TAG.pack(TICK_TAG) + TICK.pack(sim.time, sim.day, sim.dead,
+                                                       snapshot.DEATH_CAUSES.index(sim.death_cause))
+        self.queue.put(("records", bytes(self.buffer)))
+        self.buffer.clear()
+        if sim.time - self.base_time >= self.compact_every:
+            self.checkpoint()
+
+    def checkpoint(self):
+        # Serializing is in memory; the writer thread puts it on disk and
+        # starts a new journal on top of it
+        if self._check_error():
+            return
+        sim = self.sim
+        self.base_time = sim.time
+        self.last_man = snapshot.pack_man(sim.man)
+        self.last_wolves = snapshot.pack_wolves(sim.environment.wolves)
+        self.last_weather = WEATHER.pack(Weather.conditions.index(sim.weather.current_condition),
+                                         sim.weather.change_time)
+        self.buffer.clear()
+        self.queue.put(("snapshot", snapshot.dumps(sim), sim.time))
+
+    def close(self):
+        # Detaches from the simulation and waits for everything queued so far
+        self.sim.journal = self.sim.environment.journal = None
+        self.queue.put(("close",))
+        self.writer.join()
+        self._check_error()
+
+    def _check_error(self):
+        # After a failed write nothing drains the queue any more, so stop
+        # journaling and say so once; the game carries on without autosave
+        if self.error is None:
+            return False
+        if not self.failed:
+            self.failed = True
+            self.sim.journal = self.sim.environment.journal = None
+            self.buffer.clear()
+            while not self.queue.empty():
+                self.queue.get()
+            print(f"Autosave stopped: {self.error}", file=sys.stderr)
+        return True
+
+    def _write_loop(self):
+        journal = None
+        try:
+            while True:
+                message = self.queue.get()
+                if message[0] == "records":
+                    if journal is not None:
+                        journal.write(message[1])
+                elif message[0] == "snapshot":
+                    snapshot.write_atomic(self.snapshot_path, message[1])
+                    if journal is not None:
+                        journal.close()
+                    # A crash before this header lands leaves the old journal,
+                    # which recovery ignores since its base time doesn't match
+                    journal = open(self.journal_path, "wb")
+                    journal.write(HEADER.pack(MAGIC, VERSION, message[2]))
+                    journal.flush()
+                else:
+                    break
+                if self.queue.empty() and journal is not None:
+                    journal.flush()
+        except OSError as error:
+            self.error = error
+        finally:
+            if journal is not None:
+                journal.close()
+
+
+def _read_records(data, base_time):
+    # Yields the records of each complete tick; a torn tail is dropped
+    if len(data) < HEADER.size:
+        return
+    magic, version, time = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION or time != base_time:
+        return
+    offset = HEADER.size
+    tick = []
+    try:
+        while offset < len(data):
+            (tag,) = TAG.unpack_from(data, offset)
+            offset += TAG.size
+            if tag == TILE_TAG:
+                tick.append((tag, TILE.unpack_from(data, offset)))
+                offset += TILE.size
+            elif tag == BERRY_TIMER_TAG:
+                tick.append((tag, BERRY_TIMER.unpack_from(data, offset)))
+                offset += BERRY_TIMER.size
+            elif tag == MAN_TAG:
+                tick.append((tag, snapshot.unpack_man(data, offset)))
+                offset += snapshot.MAN.size
+            elif tag == WOLVES_TAG:
+                wolves, offset = snapshot.unpack_wolves(data, offset)
+                tick.append((tag, wolves))
+            elif tag == WEATHER_TAG:
+                tick.append((tag, WEATHER.unpack_from(data, offset)))
+                offset += WEATHER.size
+            elif tag == TICK_TAG:
+                tick.append((tag, TICK.unpack_from(data, offset)))
+                offset += TICK.size
+                yield tick
+                tick = []
+            else:
+                return
+    except struct.error:
+        return
+
+
+def autosave_time(directory="."):
+    # When the autosave in directory was last written, or None without one
+    snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+    if not os.path.exists(snapshot_path):
+        return None
+    journal_path = os.path.join(directory, JOURNAL_FILE)
+    if not os.path.exists(journal_path):
+        return os.path.getmtime(snapshot_path)
+    return max(os.path.getmtime(snapshot_path), os.path.getmtime(journal_path))
+
+
+def discard(directory="."):
+    # Deletes the autosave in directory, e.g. once its run has ended
+    for name in (SNAPSHOT_FILE, JOURNAL_FILE):
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+
+
+def recover(directory="."):
+    # Last autosave snapshot with its journal replayed on top, or None
+    snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+    if not os.path.exists(snapshot_path):
+        return None
+    # Read into memory rather than mapped, the autosave file gets replaced
+    sim = snapshot.load(snapshot_path, use_mmap=False)
+    env = sim.environment
+    try:
+        with open(os.path.join(directory, JOURNAL_FILE), "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        data = b""
+
+    base_time = sim.time
+    for tick in _read_records(data, base_time):
+        for tag, record in tick:
+            if tag == TILE_TAG:
+                env.set_tile(record[:2], record[2])
+            elif tag == BERRY_TIMER_TAG:
+                if record[2] < 0:
+                    env.clear_berry_timer(record[:2])
+                else:
+                    env._track_removed_berry(record[:2], record[2])
+            elif tag == MAN_TAG:
+                sim.man = record
+            elif tag == WOLVES_TAG:
+                env.wolves = record
+            elif tag == WEATHER_TAG:
+                sim.weather.current_condition = Weather.conditions[record[0]]
+                sim.weather.change_time = record[1]
+            else:
+                sim.time, sim.day, dead, cause = record
+                sim.dead = bool(dead)
+                sim.death_cause = snapshot.DEATH_CAUSES[cause]
+                env.update_chunks(sim.man.x, sim.man.y)
+    sim.schedule_weather()
+
+    if sim.time != base_time:
+        # Random states aren't journaled; the replayed run continues from
+        # fresh streams derived from the seed and the recovered tick
+        env.rng = make_rng(sim.seed, f"environment:{sim.time}")
+        sim.rng = make_rng(sim.seed, f"behaviour:{sim.time}")
+        sim.weather.rng = make_rng(sim.seed, f"weather:{sim.time}")
+    return sim
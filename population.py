@@ -0,0 +1,277 @@
+import numpy as np
+
+from simulation import (BERRIES_SLOT, BERRY, CHUNK_SIZE, EMPTY, GRID_SIZE, INVENTORY_ITEMS, STONE,
+                        STONE_SLOT, TREE, WATER, WOOD_SLOT, Environment, FlowField, Weather, make_rng)
+
+# Task codes; index 0 is "no task" and makes the man wander
+TASK_CODES = [None, "Mining", "Woodcutting", "Foraging", "Hunting"]
+HUNT = -2  # Pseudo tile kind for agents chasing a wolf
+TASK_TARGETS = np.array([-1, STONE, TREE, BERRY, HUNT], dtype=np.int8)
+
+DEATH_CAUSES = [None, "health", "hunger", "thirst"]
+
+DIRECTIONS = np.array([(-1, 0), (1, 0), (0, -1), (0, 1)])
+
+
+BRUTE_FORCE_PAIRS = 1 << 16  # Below this many query-target pairs a full scan is cheaper
+TARGETS_PER_CELL = 2
+
+
+def _nearest_brute(xs, ys, txs, tys, block=1024):
+    # Index of the closest (tx, ty) for every (x, y), first one on ties
+    nearest = np.empty(len(xs), dtype=np.intp)
+    for start in range(0, len(xs), block):
+        dx = xs[start:start + block, None] - txs[None, :]
+        dy = ys[start:start + block, None] - tys[None, :]
+        nearest[start:start + block] = np.argmin(dx * dx + dy * dy, axis=1)
+    return nearest
+
+
+def _nearest(xs, ys, txs, tys):
+    # Same answers as _nearest_brute from a spatial hash: targets sorted by
+    # grid cell, each query only looking at the 3x3 cells around its own.
+    # Anything outside those is more than a cell away on some axis, so a
+    # closer candidate inside settles the query; the rest get a full scan.
+    count = len(txs)
+    if len(xs) * count <= BRUTE_FORCE_PAIRS:
+        return _nearest_brute(xs, ys, txs, tys)
+    x0, y0 = txs.min(), tys.min()
+    width = max(txs.max() - x0, tys.max() - y0) + 1
+    cell = max(1, int(width / np.sqrt(count / TARGETS_PER_CELL)))
+    columns = width // cell + 1
+    keys = (txs - x0) // cell * columns + (tys - y0) // cell
+    # Stable, so targets sharing a cell stay in index order
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+
+    qcx, qcy = (xs - x0) // cell, (ys - y0) // cell
+    best = np.full(len(xs), np.iinfo(np.int64).max, dtype=np.int64)
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            ncx, ncy = qcx + dx, qcy + dy
+            inside = (ncx >= 0) & (ncx < columns) & (ncy >= 0) & (ncy < columns)
+            neighbour = ncx * columns + ncy
+            starts = np.searchsorted(keys, neighbour, "left")
+            counts = np.where(inside, np.searchsorted(keys, neighbour, "right") - starts, 0)
+            total = counts.sum()
+            if not total:
+                continue
+            # One row per (query, target in its neighbour cell) pair
+            queries = np.repeat(np.arange(len(xs)), counts)
+            ranks = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            targets = order[np.repeat(starts, counts) + ranks]
+            ddx = xs[queries] - txs[targets]
+            ddy = ys[queries] - tys[targets]
+            # Distance first, then target index, packed into one sortable key
+            np.minimum.at(best, queries, (ddx * ddx + ddy * ddy).astype(np.int64) * count + targets)
+
+    nearest = best % count
+    unsettled = np.flatnonzero(best // count >= (cell + 1) ** 2)
+    if unsettled.size:
+        nearest[unsettled] = _nearest_brute(xs[unsettled], ys[unsettled], txs, tys)
+    return nearest
+
+
+class PopulationSimulation:
+    # Many men and wolves in one world, stored as parallel NumPy arrays so
+    # that each phase of a tick is a handful of array operations instead of
+    # a Python loop over agent objects. Follows the same rules as Simulation,
+    # except that hunters step around trees instead of planning paths.
+    def __init__(self, seed=None, size=GRID_SIZE, men=100, wolves=100, task=None):
+        # Every chunk stays resident, agents are spread over the whole map
+        self.environment = Environment(seed, size, load_radius=size // CHUNK_SIZE + 1, wolves=0)
+        # Everyone heading for the same kind of tile walks the same field
+        self.fields = {kind: FlowField(self.environment, kind) for kind in (STONE, TREE, BERRY, WATER)}
+        self.seed = self.environment.seed
+        self.weather = Weather(make_rng(self.seed, "weather"))
+        self.rng = np.random.default_rng(make_rng(self.seed, "population").getrandbits(64))
+        self.size = size
+        self.time = 0
+        self.day = 0
+
+        self.x = self.rng.integers(0, size, men)
+        self.y = self.rng.integers(0, size, men)
+        self.health = np.full(men, 200)
+        self.stamina = np.full(men, 200)
+        self.last_ate = np.zeros(men, dtype=np.int64)
+        self.last_drank = np.zeros(men, dtype=np.int64)
+        self.inventory = np.zeros((men, len(INVENTORY_ITEMS)), dtype=np.int64)
+        self.armed = np.zeros(men, dtype=bool)
+        self.task = np.full(men, TASK_CODES.index(task), dtype=np.int8)
+        self.alive = np.ones(men, dtype=bool)
+        self.death_time = np.full(men, -1, dtype=np.int64)
+        self.death_cause = np.zeros(men, dtype=np.int8)
+
+        self.wolf_x = self.rng.integers(0, size, wolves)
+        self.wolf_y = self.rng.integers(0, size, wolves)
+        self.wolf_health = np.full(wolves, 50)
+        self.wolf_alive = np.ones(wolves, dtype=bool)
+
+    @property
+    def dead(self):
+        return not self.alive.any()
+
+    def step(self):
+        t = self.time
+        self.weather.update(t)
+        alive = self.alive
+
+        # Same priority chain as Simulation.step: rest, eat, drink, task
+        resting = alive & (self.stamina < 20)
+        deciding = alive & ~resting
+        hungry = deciding & (t - self.last_ate > 30)
+        eating = hungry & (self.inventory[:, BERRIES_SLOT] > 0)
+        thirsty = deciding & ~hungry & (t - self.last_drank > 25)
+        working = deciding & ~hungry & ~thirsty
+
+        self.stamina[resting] = np.minimum(100, self.stamina[resting] + 5)
+        self.inventory[eating, BERRIES_SLOT] -= 1
+        self.last_ate[eating] = t
+
+        want = np.full(len(alive), -1, dtype=np.int8)
+        want[hungry & ~eating] = BERRY
+        want[thirsty] = WATER
+        want[working] = TASK_TARGETS[self.task[working]]
+
+        has_target = self._follow_fields(want) | self._hunt(want == HUNT)
+        self._wander(working & ~has_target)
+        self._update_wolves()
+        self._check_step()
+        self.environment.respawn_berries(t)
+        self._check_death()
+
+        self.time += 1
+        if self.time % (24 * 60) == 0:
+            self.day += 1
+
+    def run(self, ticks):
+        for _ in range(ticks):
+            self.step()
+            if self.dead:
+                break
+        return self.time
+
+    def _follow_fields(self, want):
+        # One step down the flow field of the tile each man wants
+        moved = np.zeros(len(want), dtype=bool)
+        for kind, field in self.fields.items():
+            idx = np.flatnonzero(want == kind)
+            if not idx.size:
+                continue
+            new_x, new_y, reachable = field.steps(self.x[idx], self.y[idx])
+            self.x[idx], self.y[idx] = new_x, new_y
+            moved[idx[reachable]] = True
+        self.stamina[moved] = np.maximum(0, self.stamina[moved] - 1)
+        return moved
+
+    def _hunt(self, hunting):
+        # Wolves move every tick, so hunters step at the nearest one without
+        # planning a path. Trees block every cell but the wolf's: a hunter
+        # tries the diagonal step, then either straight step that still
+        # closes in, and waits if all of them are blocked.
+        idx = np.flatnonzero(hunting)
+        wolves = np.flatnonzero(self.wolf_alive)
+        if not idx.size or not wolves.size:
+            return np.zeros(len(hunting), dtype=bool)
+        prey = wolves[_nearest(self.x[idx], self.y[idx], self.wolf_x[wolves], self.wolf_y[wolves])]
+        x, y = self.x[idx], self.y[idx]
+        goal_x, goal_y = self.wolf_x[prey], self.wolf_y[prey]
+        dx, dy = np.sign(goal_x - x), np.sign(goal_y - y)
+        none = np.zeros_like(dx)
+        step_x, step_y = none.copy(), none.copy()
+        pending = np.ones(idx.size, dtype=bool)
+        for cx, cy in ((dx, dy), (dx, none), (none, dy)):
+            new_x, new_y = x + cx, y + cy
+            free = ((new_x == goal_x) & (new_y == goal_y)) | (self.environment.tiles_at(new_x, new_y) != TREE)
+            take = pending & ((cx != 0) | (cy != 0)) & free
+            step_x[take], step_y[take] = cx[take], cy[take]
+            pending &= ~take
+        moved = idx[~pending]
+        self.x[idx] += step_x
+        self.y[idx] += step_y
+        self.stamina[moved] = np.maximum(0, self.stamina[moved] - 1)
+        return hunting
+
+    def _wander(self, wanderers):
+        idx = np.flatnonzero(wanderers)
+        if not idx.size:
+            return
+        step = DIRECTIONS[self.rng.integers(0, 4, idx.size)]
+        new_x = self.x[idx] + step[:, 0]
+        new_y = self.y[idx] + step[:, 1]
+        # Same as Simulation._wander: no wrapping at the world's edge
+        free = (new_x >= 0) & (new_x < self.size) & (new_y >= 0) & (new_y < self.size)
+        free &= self.environment.tiles_at(new_x, new_y) != TREE
+        self.x[idx[free]] = new_x[free]
+        self.y[idx[free]] = new_y[free]
+
+    def _update_wolves(self):
+        wolves = np.flatnonzero(self.wolf_alive)
+        men = np.flatnonzero(self.alive)
+        if not wolves.size or not men.size:
+            return
+        prey = men[_nearest(self.wolf_x[wolves], self.wolf_y[wolves], self.x[men], self.y[men])]
+        dx = self.x[prey] - self.wolf_x[wolves]
+        dy = self.y[prey] - self.wolf_y[wolves]
+        adjacent = (np.abs(dx) <= 1) & (np.abs(dy) <= 1)
+
+        # The man fights back against every wolf next to him
+        attacked, attackers = wolves[adjacent], prey[adjacent]
+        self.wolf_health[attacked] -= np.where(self.armed[attackers], 10, 5)
+        np.subtract.at(self.stamina, attackers, 10)
+        np.maximum(self.stamina, 0, out=self.stamina)
+        self.wolf_alive[attacked[self.wolf_health[attacked] <= 0]] = False
+
+        chasing = wolves[~adjacent]
+        self.wolf_x[chasing] += np.sign(dx[~adjacent])
+        self.wolf_y[chasing] += np.sign(dy[~adjacent])
+
+    def _check_step(self):
+        env = self.environment
+        men = np.flatnonzero(self.alive)
+        tiles = env.tiles_at(self.x[men], self.y[men])
+
+        drinking = men[tiles == WATER]
+        self.last_drank[drinking] = self.time
+        self.inventory[men[tiles == TREE], WOOD_SLOT] += 1
+
+        for kind, slot in ((BERRY, BERRIES_SLOT), (STONE, STONE_SLOT)):
+            on_tile = men[tiles == kind]
+            if not on_tile.size:
+                continue
+            # Only the first man on a tile gets the item
+            _, first = np.unique(self.x[on_tile] * self.size + self.y[on_tile], return_index=True)
+            takers = on_tile[first]
+            self.inventory[takers, slot] += 1
+            if kind == BERRY:
+                self.last_ate[takers] = self.time
+            for x, y in zip(self.x[takers].tolist(), self.y[takers].tolist()):
+                env.set_tile((x, y), EMPTY)
+                if kind == BERRY:
+                    env._track_removed_berry((x, y), self.time)
+
+    def _check_death(self):
+        cause = np.zeros(len(self.alive), dtype=np.int8)
+        cause[self.time - self.last_drank >= 200] = DEATH_CAUSES.index("thirst")
+        cause[self.time - self.last_ate >= 200] = DEATH_CAUSES.index("hunger")
+        cause[self.health <= 0] = DEATH_CAUSES.index("health")
+        died = self.alive & (cause > 0)
+        self.death_cause[died] = cause[died]
+        self.death_time[died] = self.time
+        self.alive &= ~died
+
+    def summary(self):
+        causes = {cause: int((self.death_cause == code).sum()) for code, cause in enumerate(DEATH_CAUSES) if cause}
+        survival = np.where(self.alive, self.time, self.death_time)
+        return {
+            "seed": self.seed,
+            "ticks": self.time,
+            "day": self.day,
+            "men": len(self.alive),
+            "alive": int(self.alive.sum()),
+            "deaths": causes,
+            "mean_survival_time": float(survival.mean()) if survival.size else 0.0,
+            "inventory": dict(zip(INVENTORY_ITEMS, self.inventory.sum(axis=0).tolist())),
+            "wolves": int(self.wolf_alive.sum()),
+            "weather": self.weather.current_condition,
+        }
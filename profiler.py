@@ -0,0 +1,119 @@
+import csv
+import json
+import time
+from collections import deque
+
+WINDOW = 1000  # Recent calls per phase the percentiles are taken over
+MAX_TRACE_EVENTS = 1000000
+
+# Methods timed as phases, looked up by name so one list serves both
+# Simulation and PopulationSimulation; missing ones are skipped
+SIMULATION_PHASES = ("step", "_decide", "_perform_task", "_move_towards", "_chase", "_update_wolves",
+                     "_follow_fields", "_hunt", "_wander", "_check_step", "_check_death")
+ENVIRONMENT_PHASES = ("find_closest", "update_chunks", "check_step", "respawn_berries")
+
+
+class PhaseStats:
+    __slots__ = ("calls", "total", "samples")
+
+    def __init__(self, window):
+        self.calls = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=window)
+
+    def percentile(self, p):
+        # Nearest-rank percentile of the recent samples, in seconds
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+class Profiler:
+    # Times methods by replacing them on their instance with a wrapper.
+    # Nothing is wrapped until instrument() is called and remove() puts the
+    # originals back, so code that isn't being profiled runs untouched.
+    def __init__(self, window=WINDOW, trace=False):
+        self.window = window
+        self.phases = {}
+        self.wrapped = []  # (object, name, attribute it had before)
+        self.start = time.perf_counter()
+        self.trace = [] if trace else None  # (phase, start, duration) for a Chrome trace
+
+    def instrument(self, obj, *names, prefix=""):
+        for name in names:
+            method = getattr(obj, name, None)
+            if method is None:
+                continue
+            self.wrapped.append((obj, name, obj.__dict__.get(name)))
+            setattr(obj, name, self._timed(prefix + name, method))
+
+    def remove(self):
+        for obj, name, before in reversed(self.wrapped):
+            if before is None:
+                delattr(obj, name)
+            else:
+                setattr(obj, name, before)
+        self.wrapped.clear()
+
+    def _timed(self, phase, method):
+        record = self.record
+        clock = time.perf_counter
+
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                record(phase, start, clock())
+        return timed
+
+    def record(self, phase, start, end):
+        stats = self.phases.get(phase)
+        if stats is None:
+            stats = self.phases[phase] = PhaseStats(self.window)
+        duration = end - start
+        stats.calls += 1
+        stats.total += duration
+        stats.samples.append(duration)
+        if self.trace is not None and len(self.trace) < MAX_TRACE_EVENTS:
+            self.trace.append((phase, start, duration))
+
+    def summary(self):
+        # One row per phase, times in milliseconds
+        return [{
+            "phase": phase,
+            "calls": stats.calls,
+            "total_ms": stats.total * 1000,
+            "mean_ms": stats.total / stats.calls * 1000,
+            "p50_ms": stats.percentile(50) * 1000,
+            "p95_ms": stats.percentile(95) * 1000,
+            "p99_ms": stats.percentile(99) * 1000,
+        } for phase, stats in sorted(self.phases.items())]
+
+    def export(self, path):
+        # CSV for a .csv path, JSON otherwise
+        rows = self.summary()
+        with open(path, "w", newline="") as f:
+            if path.endswith(".csv"):
+                writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else ["phase"])
+                writer.writeheader()
+                writer.writerows(rows)
+            else:
+                json.dump(rows, f, indent=1)
+
+    def export_trace(self, path):
+        # Chrome trace event format, for chrome://tracing or Perfetto
+        events = [{"name": phase, "ph": "X", "pid": 0, "tid": 0,
+                   "ts": (start - self.start) * 1e6, "dur": duration * 1e6}
+                  for phase, start, duration in self.trace or ()]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+def instrument_simulation(profiler, sim):
+    profiler.instrument(sim, *SIMULATION_PHASES, prefix="sim.")
+    profiler.instrument(sim.environment, *ENVIRONMENT_PHASES, prefix="env.")
+    if hasattr(sim, "events"):
+        # Scheduled events, which is where the weather changes
+        profiler.instrument(sim.events, "run", prefix="events.")
@@ -0,0 +1,100 @@
+from collections import OrderedDict
+
+import pygame
+
+
+class TextCache:
+    def __init__(self, max_surfaces=256):
+        self.max_surfaces = max_surfaces
+        self.fonts = {}
+        self.surfaces = OrderedDict()
+        self.font_hits = 0
+        self.font_misses = 0
+        self.hits = 0
+        self.misses = 0
+
+    def font(self, size):
+        font = self.fonts.get(size)
+        if font is None:
+            self.font_misses += 1
+            font = self.fonts[size] = pygame.font.Font(None, size)
+        else:
+            self.font_hits += 1
+        return font
+
+    def render(self, text, size, color):
+        key = (text, size, color)
+        surf = self.surfaces.get(key)
+        if surf is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surf
+        self.misses += 1
+        surf = self.surfaces[key] = self.font(size).render(text, True, color)
+        if len(self.surfaces) > self.max_surfaces:
+            self.surfaces.popitem(last=False)
+        return surf
+
+    def stats(self):
+        return {
+            "font_hits": self.font_hits,
+            "font_misses": self.font_misses,
+            "hits": self.hits,
+            "misses": self.misses,
+            "fonts": len(self.fonts),
+            "surfaces": len(self.surfaces),
+        }
+
+    def reset_stats(self):
+        self.font_hits = self.font_misses = self.hits = self.misses = 0
+
+
+ZOOM_LEVELS = (4, 6, 10, 16, 24, 32)  # Pixels per tile
+
+
+class Camera:
+    # The part of the world on screen: tile_size pixels per tile, with world
+    # tile (x0, y0) in the top left corner
+    def __init__(self, width, height, tile_size):
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+        self.x0 = self.y0 = 0
+
+    @property
+    def columns(self):
+        return -(-self.width // self.tile_size)
+
+    @property
+    def rows(self):
+        return -(-self.height // self.tile_size)
+
+    def follow(self, x, y, world_size):
+        # Centres on (x, y) but stops at the world's edge; a world that fits
+        # on screen is centred instead. True when the view moved.
+        x0, y0 = _origin(x, self.columns, world_size), _origin(y, self.rows, world_size)
+        moved = (x0, y0) != (self.x0, self.y0)
+        self.x0, self.y0 = x0, y0
+        return moved
+
+    def zoom(self, step):
+        # Moves step levels along ZOOM_LEVELS, True if the tile size changed
+        levels = [size for size in ZOOM_LEVELS if size <= self.tile_size]
+        current = len(levels) - 1 if levels else 0
+        tile_size = ZOOM_LEVELS[min(len(ZOOM_LEVELS) - 1, max(0, current + step))]
+        changed = tile_size != self.tile_size
+        self.tile_size = tile_size
+        return changed
+
+    def visible(self):
+        # World tiles on screen as x0, y0, x1, y1, partly shown ones included
+        return self.x0, self.y0, self.x0 + self.columns, self.y0 + self.rows
+
+    def to_screen(self, x, y):
+        return (x - self.x0) * self.tile_size, (y - self.y0) * self.tile_size
+
+
+def _origin(pos, count, world_size):
+    if count >= world_size:
+        return -((count - world_size) // 2)
+    return min(max(0, pos - count // 2), world_size - count)
@@ -0,0 +1,1119 @@
+import heapq
+import itertools
+import random
+import zlib
+from array import array
+
+import numpy as np
+
+# Constants
+GRID_SIZE = 100
+CHUNK_SIZE = 32
+LOAD_RADIUS = 4  # Chunks kept resident around the man in each direction
+BERRY_RESPAWN_TIME = 300
+WEATHER_CHANGE_TIME = 300
+TASKS = ["Mining", "Woodcutting", "Foraging", "Hunting"]
+PATH_MAX_NODES = 4096  # A* gives up after expanding this many cells
+PEEK_CACHE = 256  # Non-resident chunks kept decoded for display
+
+# Inventory slots
+WOOD_SLOT, STONE_SLOT, BERRIES_SLOT = range(3)
+INVENTORY_ITEMS = ("wood", "stone", "berries")
+ITEM_SLOTS = {item: slot for slot, item in enumerate(INVENTORY_ITEMS)}
+
+# Tile types
+EMPTY, TREE, BERRY, WATER, STONE = range(5)
+# Checked in order for every cell, each with a fresh roll
+TILE_CHANCES = ((TREE, 0.01), (BERRY, 0.002), (WATER, 0.001), (STONE, 0.005))
+
+
+def _tile_thresholds():
+    # The cascade above collapsed into cumulative probabilities, so a single
+    # uniform roll per cell picks its tile with exactly the same odds
+    thresholds, total, remaining = [], 0.0, 1.0
+    for _, chance in TILE_CHANCES:
+        total += remaining * chance
+        remaining *= 1 - chance
+        thresholds.append(total)
+    return np.array(thresholds, dtype=np.float32)
+
+
+TILE_THRESHOLDS = _tile_thresholds()
+TILE_LOOKUP = np.array([kind for kind, _ in TILE_CHANCES] + [EMPTY], dtype=np.uint8)
+
+# Moves allowed in one step, same as move_to_spot
+NEIGHBOURS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+NEIGHBOUR_X = np.array([dx for dx, _ in NEIGHBOURS])
+NEIGHBOUR_Y = np.array([dy for _, dy in NEIGHBOURS])
+# Staying put first, so a step is only taken when it gets closer
+STEP_X = np.r_[0, NEIGHBOUR_X]
+STEP_Y = np.r_[0, NEIGHBOUR_Y]
+UNREACHABLE = np.iinfo(np.int32).max
+
+
+def make_rng(seed, stream):
+    # Independent, reproducible stream per world and subsystem. String seeds
+    # are hashed with SHA-512, so they don't depend on PYTHONHASHSEED.
+    return random.Random(f"{seed}:{stream}")
+
+
+def generate_tiles(rng, width, height):
+    rolls = rng.random((width, height), dtype=np.float32)
+    return TILE_LOOKUP[np.searchsorted(TILE_THRESHOLDS, rolls, side="right")]
+
+
+class Inventory(array):
+    # Fixed-layout item counts indexed by slot. Item names still work as keys,
+    # so code written against the old {"wood", "stone", "berries"} dict keeps
+    # working.
+    __slots__ = ()
+
+    def __new__(cls, counts=(0, 0, 0)):
+        return super().__new__(cls, "l", counts)
+
+    def __getitem__(self, key):
+        return array.__getitem__(self, ITEM_SLOTS[key] if isinstance(key, str) else key)
+
+    def __setitem__(self, key, value):
+        array.__setitem__(self, ITEM_SLOTS[key] if isinstance(key, str) else key, value)
+
+    def __reduce__(self):
+        return Inventory, (tuple(self),)
+
+    def keys(self):
+        return INVENTORY_ITEMS
+
+    def items(self):
+        return zip(INVENTORY_ITEMS, self)
+
+    def to_dict(self):
+        return dict(self.items())
+
+    @classmethod
+    def from_dict(cls, counts):
+        return cls(counts.get(item, 0) for item in INVENTORY_ITEMS)
+
+class Man:
+    __slots__ = ("x", "y", "last_ate", "last_drank", "health", "stamina", "inventory", "weapon", "current_task")
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+        self.last_ate = 0
+        self.last_drank = 0
+        self.health = 200
+        self.stamina = 200
+        self.inventory = Inventory()
+        self.weapon = None
+        self.current_task = None  # New attribute to track the current task
+
+    def is_hungry(self, current_time):
+        return current_time - self.last_ate > 30
+
+    def is_thirsty(self, current_time):
+        return current_time - self.last_drank > 25
+
+    def get_hunger_level(self, current_time):
+        return self._get_resource_level(current_time - self.last_ate, 200.0)
+
+    def get_thirst_level(self, current_time):
+        return self._get_resource_level(current_time - self.last_drank, 200.0)
+    
+    @staticmethod
+    def _get_resource_level(duration, max_duration):
+        return 1.0 - min(1.0, max(0.0, duration / max_duration))
+
+    def move_to_spot(self, spot):
+        self.x += (spot[0] > self.x) - (spot[0] < self.x)
+        self.y += (spot[1] > self.y) - (spot[1] < self.y)
+        self.stamina = max(0, self.stamina - 1)
+
+    def rest(self):
+        self.stamina = min(100, self.stamina + 5)
+
+    def attack(self, target):
+        damage = 10 if self.weapon else 5
+        target.health -= damage
+        self.stamina = max(0, self.stamina - 10)
+
+class Wolf:
+    __slots__ = ("x", "y", "health")
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+        self.health = 50
+
+    def move_to_spot(self, spot):
+        self.x += (spot[0] > self.x) - (spot[0] < self.x)
+        self.y += (spot[1] > self.y) - (spot[1] < self.y)
+
+class Scheduler:
+    # Min-heap of timed callbacks, run in (due tick, scheduling order). There
+    # is no cancelling: a callback gets the arguments it was scheduled with
+    # and returns early if the state it was meant for has changed since.
+    def __init__(self):
+        self.heap = []
+        self.counter = itertools.count()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def schedule(self, due, callback, *args):
+        heapq.heappush(self.heap, (due, next(self.counter), callback, args))
+
+    def next_due(self):
+        return self.heap[0][0] if self.heap else None
+
+    def run(self, current_time):
+        # Only touches the events that are due
+        heap = self.heap
+        while heap and heap[0][0] <= current_time:
+            _, _, callback, args = heapq.heappop(heap)
+            callback(current_time, *args)
+
+class SpatialIndex:
+    # Uniform grid of buckets holding (x, y) positions. Behaves like a set
+    # and answers nearest-neighbour queries by searching outward ring by ring.
+    def __init__(self, items=(), cell_size=8):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.count = 0
+        self.min_cx = self.min_cy = self.max_cx = self.max_cy = 0
+        for item in items:
+            self.add(item)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for items in self.cells.values():
+            yield from items
+
+    def __contains__(self, pos):
+        items = self.cells.get((pos[0] // self.cell_size, pos[1] // self.cell_size))
+        return items is not None and pos in items
+
+    def add(self, pos):
+        cell = (pos[0] // self.cell_size, pos[1] // self.cell_size)
+        items = self.cells.get(cell)
+        if items is None:
+            self._grow_bounds(cell)
+            items = self.cells[cell] = set()
+        if pos not in items:
+            items.add(pos)
+            self.count += 1
+
+    def add_cell(self, cell, positions):
+        # Bulk insert of positions that all fall inside one bucket
+        items = self.cells.get(cell)
+        if items is None:
+            self._grow_bounds(cell)
+            items = self.cells[cell] = set()
+        before = len(items)
+        items.update(positions)
+        self.count += len(items) - before
+
+    def pop_cell(self, cell):
+        items = self.cells.pop(cell, None)
+        if items:
+            self.count -= len(items)
+            if cell[0] in (self.min_cx, self.max_cx) or cell[1] in (self.min_cy, self.max_cy):
+                self._recompute_bounds()
+        return items
+
+    def remove(self, pos):
+        cell = (pos[0] // self.cell_size, pos[1] // self.cell_size)
+        items = self.cells.get(cell)
+        if items is None or pos not in items:
+            raise KeyError(pos)
+        items.remove(pos)
+        self.count -= 1
+        if not items:
+            del self.cells[cell]
+
+    def _grow_bounds(self, cell):
+        if not self.cells:
+            self.min_cx = self.max_cx = cell[0]
+            self.min_cy = self.max_cy = cell[1]
+        else:
+            self.min_cx = min(self.min_cx, cell[0])
+            self.max_cx = max(self.max_cx, cell[0])
+            self.min_cy = min(self.min_cy, cell[1])
+            self.max_cy = max(self.max_cy, cell[1])
+
+    def _recompute_bounds(self):
+        if self.cells:
+            xs = [cell[0] for cell in self.cells]
+            ys = [cell[1] for cell in self.cells]
+            self.min_cx, self.max_cx = min(xs), max(xs)
+            self.min_cy, self.max_cy = min(ys), max(ys)
+
+    def discard(self, pos):
+        if pos in self:
+            self.remove(pos)
+
+    def nearest(self, x, y):
+        if not self.count:
+            return None
+        size = self.cell_size
+        cx, cy = x // size, y // size
+        max_ring = max(cx - self.min_cx, self.max_cx - cx, cy - self.min_cy, self.max_cy - cy)
+        best = None
+        for ring in range(max_ring + 1):
+            if best is not None:
+                # Every cell in this ring is at least this far away on one axis
+                gap = (ring - 1) * size + 1
+                if gap * gap > best[0]:
+                    break
+            for cell in self._ring(cx, cy, ring):
+                items = self.cells.get(cell)
+                if items:
+                    # Same (distance, position) ordering as the brute-force scan
+                    candidate = min(((px - x) ** 2 + (py - y) ** 2, (px, py)) for px, py in items)
+                    if best is None or candidate < best:
+                        best = candidate
+        return best[1]
+
+    @staticmethod
+    def _ring(cx, cy, ring):
+        if ring == 0:
+            yield cx, cy
+            return
+        for i in range(cx - ring, cx + ring + 1):
+            yield i, cy - ring
+            yield i, cy + ring
+        for j in range(cy - ring + 1, cy + ring):
+            yield cx - ring, j
+            yield cx + ring, j
+
+class EntityHash:
+    # Moving entities (anything with x and y) bucketed by grid cell. Built
+    # from scratch each tick, and queries see positions as of that build.
+    # remove() only drops an entity from later results, so it is safe while
+    # looping over the results of a query.
+    def __init__(self, cell_size=8):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.order = {}  # Live entity -> place in the built list, for ties
+        self.min_cx = self.min_cy = self.max_cx = self.max_cy = 0
+
+    def __len__(self):
+        return len(self.order)
+
+    def __contains__(self, entity):
+        return entity in self.order
+
+    def rebuild(self, entities):
+        size = self.cell_size
+        self.cells = cells = {}
+        self.order = {}
+        for i, entity in enumerate(entities):
+            self.order[entity] = i
+            cell = (entity.x // size, entity.y // size)
+            bucket = cells.get(cell)
+            if bucket is None:
+                cells[cell] = [entity]
+            else:
+                bucket.append(entity)
+        if cells:
+            self.min_cx = min(cx for cx, _ in cells)
+            self.max_cx = max(cx for cx, _ in cells)
+            self.min_cy = min(cy for _, cy in cells)
+            self.max_cy = max(cy for _, cy in cells)
+
+    def remove(self, entity):
+        del self.order[entity]
+
+    def within(self, x, y, radius, kind=None):
+        # Entities no more than radius tiles away on either axis, like the
+        # adjacency test in combat, in the order they were built from
+        size, order = self.cell_size, self.order
+        found = []
+        for cx in range((x - radius) // size, (x + radius) // size + 1):
+            for cy in range((y - radius) // size, (y + radius) // size + 1):
+                for entity in self.cells.get((cx, cy), ()):
+                    if (abs(entity.x - x) <= radius and abs(entity.y - y) <= radius and entity in order
+                            and (kind is None or isinstance(entity, kind))):
+                        found.append(entity)
+        found.sort(key=order.__getitem__)
+        return found
+
+    def in_rect(self, x0, y0, x1, y1, kind=None):
+        # Entities with x0 <= x < x1 and y0 <= y < y1, in the order they were
+        # built from, visiting only the cells the rectangle covers
+        size, order = self.cell_size, self.order
+        found = []
+        for cx in range(max(x0 // size, self.min_cx), min((x1 - 1) // size, self.max_cx) + 1):
+            for cy in range(max(y0 // size, self.min_cy), min((y1 - 1) // size, self.max_cy) + 1):
+                for entity in self.cells.get((cx, cy), ()):
+                    if (x0 <= entity.x < x1 and y0 <= entity.y < y1 and entity in order
+                            and (kind is None or isinstance(entity, kind))):
+                        found.append(entity)
+        found.sort(key=order.__getitem__)
+        return found
+
+    def nearest(self, x, y, kind=None):
+        # Closest entity by straight-line distance, the first built on ties
+        # like Environment.find_closest; None if there is none
+        size, order = self.cell_size, self.order
+        cx, cy = x // size, y // size
+        max_ring = max(cx - self.min_cx, self.max_cx - cx, cy - self.min_cy, self.max_cy - cy)
+        best = None
+        visited = 0
+        for ring in range(max_ring + 1):
+            if best is not None:
+                gap = (ring - 1) * size + 1
+                if gap * gap > best[0]:
+                    break
+            visited += 8 * ring or 1
+            if visited > len(order):
+                # Few entities spread far apart: checking each one is cheaper
+                # than walking the empty cells between them
+                return self._nearest_scan(x, y, kind)
+            for cell in SpatialIndex._ring(cx, cy, ring):
+                for entity in self.cells.get(cell, ()):
+                    if entity in order and (kind is None or isinstance(entity, kind)):
+                        candidate = ((entity.x - x) ** 2 + (entity.y - y) ** 2, order[entity], entity)
+                        if best is None or candidate[:2] < best[:2]:
+                            best = candidate
+        return None if best is None else best[2]
+
+    def _nearest_scan(self, x, y, kind):
+        best = None
+        for entity, i in self.order.items():
+            if kind is None or isinstance(entity, kind):
+                candidate = ((entity.x - x) ** 2 + (entity.y - y) ** 2, i, entity)
+                if best is None or candidate[:2] < best[:2]:
+                    best = candidate
+        return None if best is None else best[2]
+
+def find_path(env, start, goal, max_nodes=PATH_MAX_NODES, bounds=None):
+    # A* over 8-connected cells, one step per move like move_to_spot. Trees
+    # block every cell but the goal. Returns the cells after start up to and
+    # including goal, or None if the goal is out of reach within max_nodes
+    # or without leaving bounds (x0, y0, x1, y1, the whole world by default).
+    # Tiles are peeked, so searching never loads a chunk.
+    def estimate(cell):
+        return max(abs(cell[0] - goal[0]), abs(cell[1] - goal[1]))
+
+    def is_tree(cell):
+        tiles = env.peek_chunk((cell[0] // CHUNK_SIZE, cell[1] // CHUNK_SIZE))
+        return tiles[cell[0] % CHUNK_SIZE, cell[1] % CHUNK_SIZE] == TREE
+
+    # Walking straight at the goal takes the Chebyshev distance in steps, the
+    # fewest possible, so if nothing is in the way there's nothing to search
+    path = []
+    x, y = start
+    while (x, y) != goal:
+        x += (goal[0] > x) - (goal[0] < x)
+        y += (goal[1] > y) - (goal[1] < y)
+        if (x, y) != goal and is_tree((x, y)):
+            break
+        path.append((x, y))
+    else:
+        return path
+
+    x0, y0, x1, y1 = bounds or (0, 0, env.size, env.size)
+    cost = {start: 0}
+    came_from = {}
+    heap = [(estimate(start), estimate(start), start)]
+    expanded = 0
+    while heap:
+        _, _, cell = heapq.heappop(heap)
+        if cell == goal:
+            path = []
+            while cell != start:
+                path.append(cell)
+                cell = came_from[cell]
+            path.reverse()
+            return path
+        expanded += 1
+        if expanded > max_nodes:
+            return None
+        steps = cost[cell] + 1
+        for dx, dy in NEIGHBOURS:
+            nxt = (cell[0] + dx, cell[1] + dy)
+            if not (x0 <= nxt[0] < x1 and y0 <= nxt[1] < y1) or steps >= cost.get(nxt, steps + 1):
+                continue
+            if nxt != goal and is_tree(nxt):
+                continue
+            cost[nxt] = steps
+            came_from[nxt] = cell
+            # Ties go to the cell closer to the goal, then by position
+            heapq.heappush(heap, (steps + estimate(nxt), estimate(nxt), nxt))
+    return None
+
+class FlowField:
+    # Steps from every cell of a rectangle to the nearest tile of one kind,
+    # found by breadth-first search over 8-connected cells with trees
+    # blocking everything but the targets. Agents walk it by moving to the
+    # neighbour with the smallest distance, an O(1) lookup per step, so any
+    # number of agents heading for the same kind share one field. Tile
+    # changes are queued and applied incrementally on the next lookup.
+    #
+    # Cells are kept flat with a one cell border that is never passable, so
+    # a neighbour is just an offset and needs no bounds check.
+    def __init__(self, env, kind, bounds=None):
+        self.env = env
+        self.kind = kind
+        self.changed = []
+        self._layout(bounds or (0, 0, env.size, env.size))
+        self.reset()
+        env.flow_fields.append(self)
+
+    @property
+    def bounds(self):
+        return self.x0, self.y0, self.x0 + self.width, self.y0 + self.height
+
+    def _layout(self, bounds):
+        x0, y0, x1, y1 = bounds
+        self.x0, self.y0 = x0, y0
+        self.width, self.height = x1 - x0, y1 - y0
+        self.stride = self.height + 2
+        self.offsets = NEIGHBOUR_X * self.stride + NEIGHBOUR_Y
+        self.step_offsets = STEP_X * self.stride + STEP_Y
+
+    def move(self, bounds):
+        # Covers a new rectangle, whose tiles must be resident. Distances in
+        # the part that overlaps the old rectangle are kept where they can't
+        # have changed, so crossing a chunk border doesn't redo the search.
+        self.update()
+        old_x0, old_y0, old_x1, old_y1 = self.bounds
+        x0, y0, x1, y1 = bounds
+        ix0, iy0, ix1, iy1 = max(x0, old_x0), max(y0, old_y0), min(x1, old_x1), min(y1, old_y1)
+        if ix0 >= ix1 or iy0 >= iy1:
+            self._layout(bounds)
+            self.reset()
+            return
+
+        # Cells that leave the field, and every cell whose distance may have
+        # been measured through them, lose their distance
+        shape = (self.width + 2, self.height + 2)
+        leaving = np.zeros(shape, dtype=bool)
+        leaving[1:-1, 1:-1] = True
+        leaving[ix0 - old_x0 + 1:ix1 - old_x0 + 1, iy0 - old_y0 + 1:iy1 - old_y0 + 1] = False
+        self.dist[self._dependents(np.flatnonzero(leaving))] = UNREACHABLE
+        kept = self.dist.reshape(shape)[ix0 - old_x0 + 1:ix1 - old_x0 + 1, iy0 - old_y0 + 1:iy1 - old_y0 + 1]
+
+        self._layout(bounds)
+        tiles = self.env.tiles_in(*bounds)
+        passable = np.zeros((self.width + 2, self.height + 2), dtype=bool)
+        passable[1:-1, 1:-1] = tiles != TREE
+        dist = np.full(passable.shape, UNREACHABLE, dtype=np.int32)
+        dist[ix0 - x0 + 1:ix1 - x0 + 1, iy0 - y0 + 1:iy1 - y0 + 1] = kept
+        sources = tiles == self.kind
+        sources[ix0 - x0:ix1 - x0, iy0 - y0:iy1 - y0] = False
+        self.passable = passable.ravel()
+        self.dist = dist.ravel()
+        self.stamp = np.zeros(self.passable.size, dtype=np.intp)
+
+        # Search on from the new targets and from every known distance next
+        # to a cell without one; anything else can't get shorter
+        xs, ys = np.nonzero(sources)
+        new_sources = (xs + 1) * self.stride + ys + 1
+        self.dist[new_sources] = 0
+        unknown = self.passable & (self.dist == UNREACHABLE)
+        near_unknown = np.zeros(self.passable.size, dtype=bool)
+        for offset in self.offsets:
+            if offset > 0:
+                near_unknown[:-offset] |= unknown[offset:]
+            else:
+                near_unknown[-offset:] |= unknown[:offset]
+        cells = np.union1d(new_sources, np.flatnonzero(near_unknown & (self.dist < UNREACHABLE)))
+        self._relax(cells, self.dist[cells])
+
+    def reset(self):
+        tiles = self.env.tiles_in(*self.bounds)
+        passable = np.zeros((self.width + 2, self.height + 2), dtype=bool)
+        passable[1:-1, 1:-1] = tiles != TREE
+        self.passable = passable.ravel()
+        self.dist = np.full(self.passable.size, UNREACHABLE, dtype=np.int32)
+        self.stamp = np.zeros(self.passable.size, dtype=np.intp)  # Scratch space for _dedupe
+        self.changed.clear()
+        self.rebuild = False
+        xs, ys = np.nonzero(tiles == self.kind)
+        self.add_sources((xs + 1) * self.stride + ys + 1)
+
+    def cell(self, x, y):
+        # Flat index of a world position, or None outside the field
+        x, y = x - self.x0, y - self.y0
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return (x + 1) * self.stride + y + 1
+        return None
+
+    def tile_changed(self, pos, old, new):
+        cell = self.cell(*pos)
+        if cell is None:
+            return
+        if TREE in (old, new):
+            # Passability changed, start over
+            self.rebuild = True
+        elif self.kind in (old, new):
+            self.changed.append(cell)
+
+    def update(self):
+        if self.rebuild:
+            self.reset()
+        if not self.changed:
+            return
+        cells = np.unique(np.array(self.changed))
+        self.changed.clear()
+        now = self.env.tiles_at(cells // self.stride - 1 + self.x0, cells % self.stride - 1 + self.y0) == self.kind
+        was = self.dist[cells] == 0
+        self.remove_sources(cells[was & ~now])
+        self.add_sources(cells[now & ~was])
+
+    def distance(self, x, y):
+        cell = self.cell(x, y)
+        return UNREACHABLE if cell is None else int(self.dist[cell])
+
+    def step(self, x, y):
+        # Next cell towards the nearest target, or None if none is reachable
+        self.update()
+        cell = self.cell(x, y)
+        if cell is None:
+            return None
+        dist = self.dist[cell + self.step_offsets]
+        best = int(dist.argmin())
+        if dist[best] == UNREACHABLE:
+            return None
+        return x + int(STEP_X[best]), y + int(STEP_Y[best])
+
+    def steps(self, xs, ys):
+        # Vectorized step: next x, next y and whether a target is reachable
+        self.update()
+        lx, ly = xs - self.x0, ys - self.y0
+        inside = (lx >= 0) & (lx < self.width) & (ly >= 0) & (ly < self.height)
+        cells = np.where(inside, (lx + 1) * self.stride + ly + 1, 0)
+        dist = self.dist[cells[:, None] + self.step_offsets]
+        best = np.argmin(dist, axis=1)
+        reachable = inside & (dist[np.arange(len(xs)), best] < UNREACHABLE)
+        best[~reachable] = 0
+        return xs + STEP_X[best], ys + STEP_Y[best], reachable
+
+    def add_sources(self, cells):
+        # Distances only ever shrink
+        self.dist[cells] = 0
+        self._relax(cells, np.zeros(len(cells), dtype=np.int32))
+
+    def remove_sources(self, cells):
+        dist = self.dist
+        # Every cell whose distance may have been measured through a removed
+        # source: follow neighbours exactly one step further out
+        region, frontier, level = [cells], cells, 0
+        while frontier.size:
+            neighbours = (frontier[:, None] + self.offsets).ravel()
+            frontier = self._dedupe(neighbours[dist[neighbours] == level + 1])
+            region.append(frontier)
+            level += 1
+        region = np.concatenate(region)
+        dist[region] = UNREACHABLE
+        # Search back into the region from the distances still known around it
+        neighbours = (region[:, None] + self.offsets).ravel()
+        neighbours = self._dedupe(neighbours[dist[neighbours] < UNREACHABLE])
+        self._relax(neighbours, dist[neighbours])
+
+    def _dependents(self, cells):
+        # cells with a distance plus everything downstream of them: cells
+        # exactly one step further out than a neighbour already included
+        dist = self.dist
+        seen = np.zeros(dist.size, dtype=bool)
+        frontier = cells[dist[cells] < UNREACHABLE]
+        seen[frontier] = True
+        region = [frontier]
+        while frontier.size:
+            neighbours = frontier[:, None] + self.offsets
+            neighbours = neighbours[dist[neighbours] == (dist[frontier] + 1)[:, None]]
+            frontier = self._dedupe(neighbours[~seen[neighbours]])
+            seen[frontier] = True
+            region.append(frontier)
+        return np.concatenate(region)
+
+    def _dedupe(self, cells):
+        # Drops repeated cells without sorting: only the last write of each
+        # cell's position into the scratch array survives
+        order = np.arange(len(cells))
+        self.stamp[cells] = order
+        return cells[self.stamp[cells] == order]
+
+    def _relax(self, cells, levels):
+        # Breadth-first search from cells that start at different distances,
+        # expanding each level once every cell at that distance is known
+        order = np.argsort(levels, kind="stable")
+        cells, levels = cells[order], levels[order]
+        frontier = cells[:0]
+        start, level = 0, None
+        while True:
+            if not frontier.size:
+                if start == len(levels):
+                    return
+                level = int(levels[start])
+            end = np.searchsorted(levels, level, side="right")
+            frontier = np.concatenate((frontier, cells[start:end]))
+            start = end
+            neighbours = (frontier[:, None] + self.offsets).ravel()
+            neighbours = neighbours[self.passable[neighbours] & (self.dist[neighbours] > level + 1)]
+            frontier = self._dedupe(neighbours)
+            self.dist[frontier] = level + 1
+            level += 1
+
+class Environment:
+    # The world is split into CHUNK_SIZE x CHUNK_SIZE uint8 tile grids that are
+    # generated on demand from the world seed and the chunk coordinates. Only
+    # chunks near the man stay resident; the resource indexes cover exactly
+    # the resident chunks.
+    def __init__(self, seed=None, size=GRID_SIZE, load_radius=LOAD_RADIUS, wolves=2, create=True):
+        self.seed = random.SystemRandom().randrange(2 ** 32) if seed is None else seed
+        self.rng = make_rng(self.seed, "environment")
+        self.size = size
+        self.load_radius = load_radius
+        self.spawn = (size // 2, size // 2)
+        self.chunks = {}
+        self.paged = {}  # Compressed tiles and timers of modified chunks that were evicted
+        # Tiles and timers of chunks that were resident in a loaded snapshot,
+        # attached when update_chunks next needs them
+        self.mapped = {}
+        self.modified = set()
+        self.peeked = {}  # Non-resident chunks read for display, with the paged data they came from
+        # Per-chunk tick each berry was eaten at (-1 where none is pending),
+        # with one scheduled respawn per pending berry
+        self.removed_berries = {}
+        self.respawns = Scheduler()
+        self.center = None
+        self.trees = SpatialIndex(cell_size=CHUNK_SIZE)
+        self.berries = SpatialIndex(cell_size=CHUNK_SIZE)
+        self.water_sources = SpatialIndex(cell_size=CHUNK_SIZE)
+        self.stones = SpatialIndex(cell_size=CHUNK_SIZE)
+        self.resources = {TREE: self.trees, BERRY: self.berries, WATER: self.water_sources, STONE: self.stones}
+        self.wolves = []
+        self.journal = None  # Told about every tile and berry timer change while autosaving
+        self.flow_fields = []  # Told about every tile change
+        if create:
+            self._create_environment(wolves)
+
+    def _create_environment(self, wolves):
+        self.update_chunks(*self.spawn)
+
+        for _ in range(wolves):
+            self.wolves.append(Wolf(self.rng.randint(0, self.size-1), self.rng.randint(0, self.size-1)))
+
+    def update_chunks(self, x, y):
+        center = (x // CHUNK_SIZE, y // CHUNK_SIZE)
+        if center == self.center:
+            return
+        self.center = center
+        radius = self.load_radius
+        last_chunk = (self.size - 1) // CHUNK_SIZE
+        for cx in range(max(0, center[0] - radius), min(last_chunk, center[0] + radius) + 1):
+            for cy in range(max(0, center[1] - radius), min(last_chunk, center[1] + radius) + 1):
+                if (cx, cy) not in self.chunks:
+                    self._load_chunk((cx, cy))
+        # One chunk of slack so walking along a chunk border doesn't thrash
+        for chunk in list(self.chunks):
+            if max(abs(chunk[0] - center[0]), abs(chunk[1] - center[1])) > radius + 1:
+                self._evict_chunk(chunk)
+
+    def loaded_bounds(self):
+        # Tiles update_chunks keeps resident around its center, as x0, y0, x1, y1
+        radius, last_chunk = self.load_radius, (self.size - 1) // CHUNK_SIZE
+        cx, cy = self.center
+        return (max(0, cx - radius) * CHUNK_SIZE, max(0, cy - radius) * CHUNK_SIZE,
+                min(self.size, (min(last_chunk, cx + radius) + 1) * CHUNK_SIZE),
+                min(self.size, (min(last_chunk, cy + radius) + 1) * CHUNK_SIZE))
+
+    def tiles_in(self, x0, y0, x1, y1):
+        # Copy of the tiles in a rectangle, sliced chunk by chunk
+        tiles = np.empty((x1 - x0, y1 - y0), dtype=np.uint8)
+        for cx in range(x0 // CHUNK_SIZE, (x1 - 1) // CHUNK_SIZE + 1):
+            for cy in range(y0 // CHUNK_SIZE, (y1 - 1) // CHUNK_SIZE + 1):
+                chunk = self._chunk((cx, cy))
+                left, top = cx * CHUNK_SIZE, cy * CHUNK_SIZE
+                i0, j0 = max(x0, left), max(y0, top)
+                i1, j1 = min(x1, left + CHUNK_SIZE), min(y1, top + CHUNK_SIZE)
+                tiles[i0 - x0:i1 - x0, j0 - y0:j1 - y0] = chunk[i0 - left:i1 - left, j0 - top:j1 - top]
+        return tiles
+
+    def resources_in(self, x0, y0, x1, y1):
+        # Positions of the non-empty tiles in a rectangle, by kind. Chunks that
+        # aren't resident are read without loading them, so looking at the
+        # world never changes it.
+        x0, y0, x1, y1 = max(0, x0), max(0, y0), min(self.size, x1), min(self.size, y1)
+        found = {}
+        if x0 >= x1 or y0 >= y1:
+            return found
+        for cx in range(x0 // CHUNK_SIZE, (x1 - 1) // CHUNK_SIZE + 1):
+            for cy in range(y0 // CHUNK_SIZE, (y1 - 1) // CHUNK_SIZE + 1):
+                left, top = cx * CHUNK_SIZE, cy * CHUNK_SIZE
+                i0, j0 = max(x0, left), max(y0, top)
+                i1, j1 = min(x1, left + CHUNK_SIZE), min(y1, top + CHUNK_SIZE)
+                tiles = self.peek_chunk((cx, cy))[i0 - left:i1 - left, j0 - top:j1 - top]
+                xs, ys = np.nonzero(tiles)
+                for kind, x, y in zip(tiles[xs, ys].tolist(), (xs + i0).tolist(), (ys + j0).tolist()):
+                    found.setdefault(kind, []).append((x, y))
+        return found
+
+    def peek_chunk(self, chunk):
+        # Read-only tiles of a chunk, resident or not
+        tiles = self.chunks.get(chunk)
+        if tiles is not None:
+            return tiles
+        if chunk in self.mapped:
+            return self.mapped[chunk][0]
+        source = self.paged.get(chunk)
+        cached = self.peeked.get(chunk)
+        if cached is not None and cached[0] is source:
+            return cached[1]
+        if source is None:
+            tiles = self._generate_chunk(chunk)
+        else:
+            tiles = np.frombuffer(zlib.decompress(source[0]), dtype=np.uint8).reshape(CHUNK_SIZE, CHUNK_SIZE)
+        self.peeked[chunk] = (source, tiles)
+        if len(self.peeked) > PEEK_CACHE:
+            del self.peeked[next(iter(self.peeked))]
+        return tiles
+
+    def tile_at(self, x, y):
+        if not (0 <= x < self.size and 0 <= y < self.size):
+            return EMPTY
+        tiles = self._chunk((x // CHUNK_SIZE, y // CHUNK_SIZE))
+        return int(tiles[x % CHUNK_SIZE, y % CHUNK_SIZE])
+
+    def tiles_at(self, xs, ys):
+        # Vectorized tile_at for arrays of coordinates, one gather per chunk
+        tiles = np.zeros(len(xs), dtype=np.uint8)
+        inside = np.flatnonzero((xs >= 0) & (xs < self.size) & (ys >= 0) & (ys < self.size))
+        if not inside.size:
+            return tiles
+        cxs, cys = xs[inside] // CHUNK_SIZE, ys[inside] // CHUNK_SIZE
+        keys = cxs * self.size + cys
+        order = np.argsort(keys, kind="stable")
+        starts = np.flatnonzero(np.r_[True, keys[order][1:] != keys[order][:-1]])
+        for start, end in zip(starts, np.r_[starts[1:], order.size]):
+            group = inside[order[start:end]]
+            first = order[start]
+            chunk = self._chunk((int(cxs[first]), int(cys[first])))
+            tiles[group] = chunk[xs[group] % CHUNK_SIZE, ys[group] % CHUNK_SIZE]
+        return tiles
+
+    def set_tile(self, pos, kind):
+        chunk = (pos[0] // CHUNK_SIZE, pos[1] // CHUNK_SIZE)
+        tiles = self._chunk(chunk)
+        i, j = pos[0] % CHUNK_SIZE, pos[1] % CHUNK_SIZE
+        old = int(tiles[i, j])
+        if old:
+            self.resources[old].discard(pos)
+        tiles[i, j] = kind
+        if kind:
+            self.resources[kind].add(pos)
+        self.modified.add(chunk)
+        for field in self.flow_fields:
+            field.tile_changed(pos, old, kind)
+        if self.journal is not None:
+            self.journal.tile_changed(pos, kind)
+
+    def _chunk(self, chunk):
+        tiles = self.chunks.get(chunk)
+        if tiles is None:
+            tiles = self._load_chunk(chunk)
+        return tiles
+
+    def _generate_chunk(self, chunk):
+        rng = np.random.default_rng([self.seed % 2 ** 64, chunk[0], chunk[1]])
+        tiles = generate_tiles(rng, CHUNK_SIZE, CHUNK_SIZE)
+        x0, y0 = chunk[0] * CHUNK_SIZE, chunk[1] * CHUNK_SIZE
+        # Cells past the world edge stay empty
+        tiles[max(0, self.size - x0):, :] = EMPTY
+        tiles[:, max(0, self.size - y0):] = EMPTY
+        if (self.spawn[0] // CHUNK_SIZE, self.spawn[1] // CHUNK_SIZE) == chunk:
+            tiles[self.spawn[0] - x0, self.spawn[1] - y0] = EMPTY
+        return tiles
+
+    def _load_chunk(self, chunk):
+        if chunk in self.mapped:
+            return self.attach_chunk(chunk, *self.mapped.pop(chunk))
+        if chunk in self.paged:
+            tiles, removed = self.paged.pop(chunk)
+            tiles = np.frombuffer(zlib.decompress(tiles), dtype=np.uint8).reshape(CHUNK_SIZE, CHUNK_SIZE).copy()
+            if removed is not None:
+                removed = np.frombuffer(zlib.decompress(removed), dtype=np.int32).reshape(CHUNK_SIZE, CHUNK_SIZE).copy()
+            return self.attach_chunk(chunk, tiles, removed)
+        return self.attach_chunk(chunk, self._generate_chunk(chunk))
+
+    def attach_chunk(self, chunk, tiles, removed=None):
+        # Makes already built tiles (and pending berry timers) resident
+        self.chunks[chunk] = tiles
+        if removed is not None:
+            self.removed_berries[chunk] = removed
+            xs, ys = np.nonzero(removed >= 0)
+            for i, j, removal_time in zip(xs.tolist(), ys.tolist(), removed[xs, ys].tolist()):
+                self._schedule_respawn((chunk[0] * CHUNK_SIZE + i, chunk[1] * CHUNK_SIZE + j), removal_time)
+        x0, y0 = chunk[0] * CHUNK_SIZE, chunk[1] * CHUNK_SIZE
+        xs, ys = np.nonzero(tiles)
+        found = {}
+        for kind, x, y in zip(tiles[xs, ys].tolist(), (xs + x0).tolist(), (ys + y0).tolist()):
+            found.setdefault(kind, []).append((x, y))
+        for kind, positions in found.items():
+            self.resources[kind].add_cell(chunk, positions)
+        return tiles
+
+    def _evict_chunk(self, chunk):
+        tiles = self.chunks.pop(chunk)
+        for index in self.resources.values():
+            index.pop_cell(chunk)
+        # Untouched chunks are simply regenerated from the seed next time
+        if chunk in self.modified:
+            removed = self.removed_berries.pop(chunk, None)
+            self.paged[chunk] = (zlib.compress(tiles.tobytes()),
+                                 None if removed is None else zlib.compress(removed.tobytes()))
+
+    def find_closest(self, origin, items):
+        if isinstance(items, SpatialIndex):
+            return items.nearest(origin.x, origin.y)
+        if not items:
+            return None
+        if isinstance(next(iter(items)), (Man, Wolf)):
+            return min(items, key=lambda item: (item.x - origin.x) ** 2 + (item.y - origin.y) ** 2)
+        # Ties are broken by position so the result doesn't depend on set order
+        return min(items, key=lambda item: ((item[0] - origin.x) ** 2 + (item[1] - origin.y) ** 2, item))
+
+    def check_step(self, man, current_time):
+        pos = (man.x, man.y)
+        tile = self.tile_at(*pos)
+        if tile == BERRY:
+            man.last_ate = current_time
+            man.inventory[BERRIES_SLOT] += 1
+            self.set_tile(pos, EMPTY)
+            self._track_removed_berry(pos, current_time)
+        elif tile == WATER:
+            man.last_drank = current_time
+        elif tile == TREE:
+            man.inventory[WOOD_SLOT] += 1
+        elif tile == STONE:
+            man.inventory[STONE_SLOT] += 1
+            self.set_tile(pos, EMPTY)
+
+    def _track_removed_berry(self, pos, current_time):
+        chunk = (pos[0] // CHUNK_SIZE, pos[1] // CHUNK_SIZE)
+        removed = self.removed_berries.get(chunk)
+        if removed is None:
+            removed = self.removed_berries[chunk] = np.full((CHUNK_SIZE, CHUNK_SIZE), -1, dtype=np.int32)
+        removed[pos[0] % CHUNK_SIZE, pos[1] % CHUNK_SIZE] = current_time
+        self._schedule_respawn(pos, current_time)
+        if self.journal is not None:
+            self.journal.berry_timer_changed(pos, current_time)
+
+    def clear_berry_timer(self, pos):
+        chunk = (pos[0] // CHUNK_SIZE, pos[1] // CHUNK_SIZE)
+        removed = self.removed_berries.get(chunk)
+        if removed is not None:
+            removed[pos[0] % CHUNK_SIZE, pos[1] % CHUNK_SIZE] = -1
+
+    def _schedule_respawn(self, pos, removal_time):
+        self.respawns.schedule(removal_time + BERRY_RESPAWN_TIME + 1, self._respawn_berry, pos, removal_time)
+
+    def _respawn_berry(self, current_time, pos, removal_time):
+        chunk = (pos[0] // CHUNK_SIZE, pos[1] // CHUNK_SIZE)
+        removed = self.removed_berries.get(chunk)
+        i, j = pos[0] % CHUNK_SIZE, pos[1] % CHUNK_SIZE
+        # Stale if the chunk was paged out (it is rescheduled when it comes
+        # back) or the timer was cleared or reset since
+        if removed is None or removed[i, j] != removal_time:
+            return
+        removed[i, j] = -1
+        tiles = self.chunks[chunk]
+        old = int(tiles[i, j])
+        tiles[i, j] = BERRY
+        self.berries.add(pos)
+        for field in self.flow_fields:
+            field.tile_changed(pos, old, BERRY)
+        if self.journal is not None:
+            self.journal.tile_changed(pos, BERRY)
+            self.journal.berry_timer_changed(pos, -1)
+
+    def respawn_berries(self, current_time):
+        self.respawns.run(current_time)
+
+class Weather:
+    __slots__ = ("current_condition", "change_time", "rng")
+    conditions = ("clear", "rainy", "stormy")
+
+    def __init__(self, rng=None):
+        self.current_condition = "clear"
+        self.change_time = 0
+        self.rng = rng or random.Random()
+
+    def update(self, current_time):
+        if current_time - self.change_time > WEATHER_CHANGE_TIME:
+            self.change(current_time)
+
+    def change(self, current_time):
+        self.current_condition = self.rng.choice(self.conditions)
+        self.change_time = current_time
+
+    def next_change(self):
+        return self.change_time + WEATHER_CHANGE_TIME + 1
+
+class Simulation:
+    def __init__(self, seed=None, size=GRID_SIZE, environment=None):
+        # The seed fully determines a run; without one a fresh seed is drawn
+        # and kept in self.seed so the run can be replayed
+        self.environment = environment or Environment(seed, size)
+        self.seed = self.environment.seed
+        self.rng = make_rng(self.seed, "behaviour")
+        self.man = Man(*self.environment.spawn)
+        self.weather = Weather(make_rng(self.seed, "weather"))
+        self.time = 0
+        self.day = 0
+        self.dead = False
+        self.death_cause = None
+        self.journal = None
+        self.events = Scheduler()
+        self.schedule_weather()
+        self.fields = {}  # FlowField per tile kind the man has walked to
+        self.entities = EntityHash()  # The man and the wolves, rebuilt every tick
+
+    def schedule_weather(self):
+        # Called again whenever the weather is set from outside, e.g. on load
+        self.events.schedule(self.weather.next_change(), self._change_weather, self.weather.change_time)
+
+    def _change_weather(self, current_time, change_time):
+        if self.weather.change_time != change_time:
+            return
+        self.weather.change(current_time)
+        self.schedule_weather()
+
+    def step(self):
+        self.events.run(self.time)
+        self.entities.rebuild([self.man] + self.environment.wolves)
+        self._decide()
+        self._update_wolves()
+        self.environment.update_chunks(self.man.x, self.man.y)
+        self.environment.check_step(self.man, self.time)
+        self.environment.respawn_berries(self.time)
+
+        self.death_cause = self._death_cause()
+        self.dead = self.death_cause is not None
+
+        self.time += 1
+        if self.time % (24 * 60) == 0:
+            self.day += 1
+
+        if self.journal is not None:
+            self.journal.end_tick()
+
+    def run(self, ticks):
+        for _ in range(ticks):
+            self.step()
+            if self.dead:
+                break
+        return self.time
+
+    def _decide(self):
+        if self.man.stamina < 20:
+            self.man.rest()
+        elif self.man.is_hungry(self.time):
+            if self.man.inventory[BERRIES_SLOT] > 0:
+                self.man.inventory[BERRIES_SLOT] -= 1
+                self.man.last_ate = self.time
+            else:
+                self._move_towards(BERRY)
+        elif self.man.is_thirsty(self.time):
+            self._move_towards(WATER)
+        else:
+            self._perform_task()
+
+    def _update_wolves(self):
+        # No wolf has moved since the rebuild, so the hash still knows which
+        # ones are next to the man
+        adjacent = set(self.entities.within(self.man.x, self.man.y, 1, Wolf))
+        # Iterate over a copy, killed wolves are removed from the list
+        for wolf in list(self.environment.wolves):
+            if wolf in adjacent:
+                self.man.attack(wolf)
+                if wolf.health <= 0:
+                    self.environment.wolves.remove(wolf)
+                    self.entities.remove(wolf)
+            else:
+                wolf.move_to_spot((self.man.x, self.man.y))
+
+    def _perform_task(self):
+        if self.man.current_task == "Mining":
+            if not self._move_towards(STONE):
+                self._wander(self.man)
+        elif self.man.current_task == "Woodcutting":
+            if not self._move_towards(TREE):
+                self._wander(self.man)
+        elif self.man.current_task == "Foraging":
+            if not self._move_towards(BERRY):
+                self._wander(self.man)
+        elif self.man.current_task == "Hunting":
+            wolf = self.entities.nearest(self.man.x, self.man.y, Wolf)
+            if wolf:
+                self._chase((wolf.x, wolf.y))
+            else:
+                self._wander(self.man)
+        else:
+            self._wander(self.man)
+
+    def _move_towards(self, kind):
+        # One step towards the nearest tile of this kind by walking distance,
+        # over the chunks kept loaded around the man. False if none is reachable.
+        env = self.environment
+        bounds = env.loaded_bounds()
+        field = self.fields.get(kind)
+        if field is None:
+            field = self.fields[kind] = FlowField(env, kind, bounds)
+        elif field.bounds != bounds:
+            field.move(bounds)
+        step = field.step(self.man.x, self.man.y)
+        if step is None:
+            return False
+        self.man.move_to_spot(step)
+        return True
+
+    def _chase(self, target):
+        # A moving target, so the path is planned again every tick, but only
+        # over the loaded chunks; beyond them the man heads straight for it
+        bounds = self.environment.loaded_bounds()
+        path = None
+        if bounds[0] <= target[0] < bounds[2] and bounds[1] <= target[1] < bounds[3]:
+            path = find_path(self.environment, (self.man.x, self.man.y), target, bounds=bounds)
+        self.man.move_to_spot(path[0] if path else target)
+
+    def _wander(self, entity):
+        # The world doesn't wrap; steps off the edge or into a tree are lost
+        directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+        dx, dy = self.rng.choice(directions)
+        new_x, new_y = entity.x + dx, entity.y + dy
+        size = self.environment.size
+        if 0 <= new_x < size and 0 <= new_y < size and (new_x, new_y) not in self.environment.trees:
+            entity.x, entity.y = new_x, new_y
+
+    def _check_death(self):
+        return self._death_cause() is not None
+
+    def _death_cause(self):
+        if self.man.health <= 0:
+            return "health"
+        if self.man.get_hunger_level(self.time) <= 0:
+            return "hunger"
+        if self.man.get_thirst_level(self.time) <= 0:
+            return "thirst"
+        return None
+
+    def summary(self):
+        return {
+            "seed": self.seed,
+            "ticks": self.time,
+            "day": self.day,
+            "alive": not self.dead,
+            "death_cause": self.death_cause,
+            "health": self.man.health,
+            "stamina": self.man.stamina,
+            "inventory": self.man.inventory.to_dict(),
+            "task": self.man.current_task,
+            "wolves": len(self.environment.wolves),
+            "chunks_loaded": len(self.environment.chunks),
+            "weather": self.weather.current_condition,
+        }
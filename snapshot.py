@@ -0,0 +1,281 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from simulation import CHUNK_SIZE, TASKS, Environment, Inventory, Man, Simulation, Weather, Wolf
+
+# Binary snapshot of a whole Simulation. All integers are little-endian.
+#
+#   header   magic, version, flags, body length
+#   body     world record, three RNG states, man record,
+#            wolf count + wolf records, chunk count + chunk records,
+#            then the tile and timer data the chunk records point into
+#
+# Resident chunk tiles are stored raw at 8-byte aligned offsets so an
+# uncompressed snapshot can be memory-mapped and used in place. Paged-out
+# chunks keep their zlib blobs. With FLAG_COMPRESSED the body is one zlib
+# stream.
+MAGIC = b"NPHSNAP\0"
+VERSION = 1
+FLAG_COMPRESSED = 1
+
+HEADER = struct.Struct("<8sHH4xQ")
+WORLD = struct.Struct("<qIIqiqBqBB")
+RNG = struct.Struct("<I625I?d")
+MAN = struct.Struct("<iiqqii3qBB")
+WOLF = struct.Struct("<iii")
+COUNT = struct.Struct("<I")
+CHUNK = struct.Struct("<iiBBBxQQQQ")
+
+WEAPONS = [None, "axe", "sword"]
+TASK_CODES = [None] + TASKS
+DEATH_CAUSES = [None, "health", "hunger", "thirst"]
+TILES_PER_CHUNK = CHUNK_SIZE * CHUNK_SIZE
+
+
+def _pack_rng(rng):
+    version, state, gauss = rng.getstate()
+    return RNG.pack(version, *state, gauss is not None, gauss or 0.0)
+
+
+def _unpack_rng(rng, data, offset):
+    values = RNG.unpack_from(data, offset)
+    rng.setstate((values[0], tuple(values[1:626]), values[627] if values[626] else None))
+    return offset + RNG.size
+
+
+def pack_man(man):
+    return MAN.pack(man.x, man.y, man.last_ate, man.last_drank, man.health, man.stamina, *man.inventory,
+                    WEAPONS.index(man.weapon), TASK_CODES.index(man.current_task))
+
+
+def unpack_man(data, offset=0):
+    fields = MAN.unpack_from(data, offset)
+    man = Man(fields[0], fields[1])
+    man.last_ate, man.last_drank, man.health, man.stamina = fields[2:6]
+    man.inventory = Inventory(fields[6:9])
+    man.weapon = WEAPONS[fields[9]]
+    man.current_task = TASK_CODES[fields[10]]
+    return man
+
+
+def pack_wolves(wolves):
+    return COUNT.pack(len(wolves)) + b"".join(WOLF.pack(wolf.x, wolf.y, wolf.health) for wolf in wolves)
+
+
+def unpack_wolves(data, offset=0):
+    (count,) = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    wolves = []
+    for x, y, health in WOLF.iter_unpack(data[offset:offset + WOLF.size * count]):
+        wolf = Wolf(x, y)
+        wolf.health = health
+        wolves.append(wolf)
+    return wolves, offset + WOLF.size * count
+
+
+def dumps(sim, compress=False):
+    env = sim.environment
+    man = sim.man
+    records = [
+        WORLD.pack(env.seed, env.size, env.load_radius, sim.time, sim.day,
+                   -1 if env.respawns.next_due() is None else env.respawns.next_due(),
+                   Weather.conditions.index(sim.weather.current_condition), sim.weather.change_time,
+                   sim.dead, DEATH_CAUSES.index(sim.death_cause)),
+        _pack_rng(env.rng),
+        _pack_rng(sim.rng),
+        _pack_rng(sim.weather.rng),
+        pack_man(man),
+        pack_wolves(env.wolves),
+    ]
+
+    chunks = list(env.chunks) + list(env.mapped) + list(env.paged)
+    records.append(COUNT.pack(len(chunks)))
+    offset = sum(map(len, records)) + CHUNK.size * len(chunks)
+    data = []
+
+    def place(blob):
+        nonlocal offset
+        padding = -offset % 8
+        data.append(b"\0" * padding + blob)
+        offset += padding
+        start = offset
+        offset += len(blob)
+        return start, len(blob)
+
+    for chunk in chunks:
+        paged = chunk in env.paged
+        if paged:
+            tiles, removed = env.paged[chunk]
+        elif chunk in env.mapped:
+            tiles, removed = env.mapped[chunk]
+            tiles, removed = tiles.tobytes(), None if removed is None else removed.tobytes()
+        else:
+            tiles, removed = env.chunks[chunk].tobytes(), env.removed_berries.get(chunk)
+            removed = None if removed is None else removed.tobytes()
+        tiles_at = place(tiles)
+        timers_at = (0, 0) if removed is None else place(removed)
+        records.append(CHUNK.pack(chunk[0], chunk[1], paged, chunk in env.modified, removed is not None,
+                                  *tiles_at, *timers_at))
+
+    body = b"".join(records + data)
+    flags = 0
+    if compress:
+        body = zlib.compress(body)
+        flags |= FLAG_COMPRESSED
+    return HEADER.pack(MAGIC, VERSION, flags, len(body)) + body
+
+
+def loads(data):
+    if isinstance(data, bytes):
+        # Chunk tiles are used in place and must be writable
+        data = bytearray(data)
+    magic, version, flags, length = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("not a snapshot file")
+    if version != VERSION:
+        raise ValueError(f"unsupported snapshot version {version}")
+    body = memoryview(data)[HEADER.size:HEADER.size + length]
+    if flags & FLAG_COMPRESSED:
+        body = memoryview(bytearray(zlib.decompress(body)))
+
+    # The next respawn is only informational, attach_chunk reschedules every
+    # pending berry from the chunk timers. Only the chunks around the man are
+    # attached here; the rest wait in env.mapped until update_chunks wants them.
+    (seed, size, load_radius, time, day, _, weather, change_time,
+     dead, death_cause) = WORLD.unpack_from(body, 0)
+    env = Environment(seed, size, load_radius, create=False)
+    sim = Simulation(environment=env)
+    offset = WORLD.size
+    for rng in (env.rng, sim.rng, sim.weather.rng):
+        offset = _unpack_rng(rng, body, offset)
+
+    man = sim.man = unpack_man(body, offset)
+    offset += MAN.size
+    env.wolves, offset = unpack_wolves(body, offset)
+
+    (count,) = COUNT.unpack_from(body, offset)
+    offset += COUNT.size
+    for cx, cy, paged, modified, has_timers, tiles_at, tiles_len, timers_at, timers_len in \
+            CHUNK.iter_unpack(body[offset:offset + CHUNK.size * count]):
+        chunk = (cx, cy)
+        if modified:
+            env.modified.add(chunk)
+        if paged:
+            env.paged[chunk] = (bytes(body[tiles_at:tiles_at + tiles_len]),
+                                bytes(body[timers_at:timers_at + timers_len]) if has_timers else None)
+            continue
+        # Views straight into the loaded (or memory-mapped) buffer, no copy
+        tiles = np.frombuffer(body, np.uint8, TILES_PER_CHUNK, tiles_at).reshape(CHUNK_SIZE, CHUNK_SIZE)
+        removed = None
+        if has_timers:
+            removed = np.frombuffer(body, np.int32, TILES_PER_CHUNK, timers_at).reshape(CHUNK_SIZE, CHUNK_SIZE)
+        env.mapped[chunk] = (tiles, removed)
+
+    env.update_chunks(man.x, man.y)
+    sim.time, sim.day = time, day
+    sim.weather.current_condition = Weather.conditions[weather]
+    sim.weather.change_time = change_time
+    sim.schedule_weather()
+    sim.dead = bool(dead)
+    sim.death_cause = DEATH_CAUSES[death_cause]
+    return sim
+
+
+def write_atomic(path, data):
+    # Readers see the old file or the new one, never a partial write. The old
+    # file is replaced rather than truncated, so a simulation loaded from it
+    # with mmap keeps its mapping.
+    temp = path + ".tmp"
+    with open(temp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp, path)
+
+
+def save(sim, path, compress=False):
+    write_atomic(path, dumps(sim, compress))
+
+
+def load(path, use_mmap=True):
+    with open(path, "rb") as f:
+        if not use_mmap:
+            return loads(bytearray(f.read()))
+        # Copy-on-write mapping: tiles are used in place without reading the
+        # file into memory first, and the simulation's writes never reach it
+        return loads(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY))
+
+
+def to_dict(sim):
+    # Human-readable dump for debugging; not meant to be loaded back
+    env = sim.environment
+    man = sim.man
+
+    def chunk_dict(chunk, tiles, removed):
+        return {
+            "chunk": list(chunk),
+            "modified": chunk in env.modified,
+            "tiles": ["".join(map(str, row)) for row in tiles.tolist()],
+            "removed_berries": {} if removed is None else {
+                f"{chunk[0] * CHUNK_SIZE + i},{chunk[1] * CHUNK_SIZE + j}": int(removed[i, j])
+                for i, j in zip(*np.nonzero(removed >= 0))
+            },
+        }
+
+    chunks = [chunk_dict(chunk, tiles, env.removed_berries.get(chunk)) for chunk, tiles in env.chunks.items()]
+    chunks += [chunk_dict(chunk, tiles, removed) for chunk, (tiles, removed) in env.mapped.items()]
+    for chunk, (tiles, removed) in env.paged.items():
+        tiles = np.frombuffer(zlib.decompress(tiles), np.uint8).reshape(CHUNK_SIZE, CHUNK_SIZE)
+        if removed is not None:
+            removed = np.frombuffer(zlib.decompress(removed), np.int32).reshape(CHUNK_SIZE, CHUNK_SIZE)
+        chunks.append(dict(chunk_dict(chunk, tiles, removed), paged=True))
+
+    return {
+        "seed": env.seed,
+        "size": env.size,
+        "time": sim.time,
+        "day": sim.day,
+        "dead": sim.dead,
+        "death_cause": sim.death_cause,
+        "weather": {"condition": sim.weather.current_condition, "change_time": sim.weather.change_time},
+        "man": {
+            "x": man.x,
+            "y": man.y,
+            "last_ate": man.last_ate,
+            "last_drank": man.last_drank,
+            "health": man.health,
+            "stamina": man.stamina,
+            "inventory": man.inventory.to_dict(),
+            "weapon": man.weapon,
+            "current_task": man.current_task,
+        },
+        "wolves": [{"x": wolf.x, "y": wolf.y, "health": wolf.health} for wolf in env.wolves],
+        "chunks": chunks,
+    }
+
+
+def export_json(sim, path):
+    with open(path, "w") as f:
+        json.dump(to_dict(sim), f, indent=1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect a binary world snapshot")
+    parser.add_argument("path", help="snapshot file")
+    parser.add_argument("--json", default=None, help="write a JSON export of the snapshot here")
+    args = parser.parse_args(argv)
+    sim = load(args.path)
+    if args.json:
+        export_json(sim, args.json)
+    else:
+        print(json.dumps({key: value for key, value in to_dict(sim).items() if key != "chunks"}, indent=2))
+
+
+if __name__ == "__main__":
+    main()